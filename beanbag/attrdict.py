@@ -5,6 +5,12 @@
 from . import namespace
 
 
+def _view(cls, base, path):
+    """Recreate an AttrDict viewing path within base (for unpickling)"""
+
+    return getattr(cls(base), ".base").namespace(path)
+
+
 class AttrDict(namespace.SettableHierarchialNS):
     """Allow access to dictionary via attributes as well as
        array-style references."""
@@ -76,6 +82,8 @@ class AttrDict(namespace.SettableHierarchialNS):
         except KeyError:
             return False
 
+    hash = None   # equality depends on the (mutable) contents
+
     def contains(self, path, val):
         return val in self.pos(path)
 
@@ -89,3 +97,18 @@ class AttrDict(namespace.SettableHierarchialNS):
     def len(self, path):
         return self.pos(path).__len__()
 
+
+    def reduce_ex(self, path, protocol):
+        """Pickle as the viewed dict or list itself
+
+           Only the part of the dictionary being viewed is pickled, and
+           it is handed to the pickler directly, so it is serialised as
+           quickly as a plain dict, and values within it that support
+           out-of-band pickling (eg ``pickle.PickleBuffer`` objects or
+           numpy arrays) are sent out-of-band with pickle protocol 5.
+        """
+
+        o = self.descend(path, create=False)
+        if o is self._notpresent:
+            return (_view, (self.Namespace, self.base, path))
+        return (self.Namespace, (o,))
@@ -0,0 +1,125 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Latency-aware load balancing across equivalent base URLs."""
+
+from .session import SessionWrapper
+
+import random
+import threading
+import time
+
+__all__ = ['BalancedSession']
+
+
+class Node(object):
+    """Statistics for one base URL"""
+
+    def __init__(self, url):
+        self.url = url
+        self.ewma = None
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.ejected_until = 0
+
+    def score(self):
+        return (self.ewma or 0.0) * (self.inflight + 1)
+
+    def stats(self, now):
+        return dict(url=self.url, ewma=self.ewma, inflight=self.inflight,
+                    requests=self.requests, errors=self.errors,
+                    ejected=self.ejected_until > now)
+
+
+class BalancedSession(SessionWrapper):
+    """Session wrapper that spreads requests over several base URLs
+
+       Requests are made against the first base URL, and are rewritten
+       to go to whichever node is chosen for that request. Nodes are
+       picked by the "power of two choices": two healthy nodes are
+       chosen at random, and the one with the lower EWMA of response time
+       (weighted by the number of requests in flight) is used. A node that
+       fails ``max_failures`` times in a row (by raising an exception or
+       returning a 5xx response) is ejected for ``eject_time`` seconds,
+       after which it is tried again.
+
+       This wrapper is set up automatically if a list of URLs is passed
+       as a BeanBag's ``base_url``.
+    """
+
+    def __init__(self, session, base_urls, decay=0.3, max_failures=3,
+                 eject_time=30.0):
+        """Create a BalancedSession
+
+           :param session: session to send requests with
+           :param base_urls: sequence of equivalent base URLs
+           :param decay: weight of the newest sample in the latency EWMA
+           :param max_failures: consecutive failures before ejecting a node
+           :param eject_time: seconds an ejected node is left unused
+        """
+
+        SessionWrapper.__init__(self, session)
+        self.base_urls = [u.rstrip("/") + "/" for u in base_urls]
+        if not self.base_urls:
+            raise ValueError("no base URLs supplied")
+        self.nodes = [Node(u) for u in self.base_urls]
+        self.decay = decay
+        self.max_failures = max_failures
+        self.eject_time = eject_time
+        self.lock = threading.Lock()
+        self.random = random.Random()
+
+    def choose(self):
+        """Pick a node for the next request and mark it in flight"""
+
+        now = time.time()
+        with self.lock:
+            nodes = [n for n in self.nodes if n.ejected_until <= now]
+            if not nodes:
+                nodes = [min(self.nodes, key=lambda n: n.ejected_until)]
+            if len(nodes) > 1:
+                nodes = self.random.sample(nodes, 2)
+            node = min(nodes, key=Node.score)
+            node.inflight += 1
+            node.requests += 1
+            return node
+
+    def done(self, node, latency, ok):
+        with self.lock:
+            node.inflight -= 1
+            if node.ewma is None:
+                node.ewma = latency
+            else:
+                node.ewma += self.decay * (latency - node.ewma)
+            if ok:
+                node.failures = 0
+            else:
+                node.errors += 1
+                node.failures += 1
+                if node.failures >= self.max_failures:
+                    node.ejected_until = time.time() + self.eject_time
+
+    def request(self, method, url, **kwargs):
+        node = self.choose()
+        primary = self.base_urls[0]
+        if url.startswith(primary):
+            url = node.url + url[len(primary):]
+
+        start = time.time()
+        try:
+            res = self.session.request(method, url, **kwargs)
+        except Exception:
+            self.done(node, time.time() - start, False)
+            raise
+        self.done(node, time.time() - start, res.status_code < 500)
+        return res
+
+    def stats(self):
+        """Per-node statistics"""
+
+        now = time.time()
+        with self.lock:
+            return [n.stats(now) for n in self.nodes]
@@ -3,15 +3,24 @@
 # Written by Anthony Towns <aj@erisian.com.au>
 # See LICENSE file.
 
+from .stats import endpoint
+
+import threading
+
 
 class BeanBagException(Exception):
     """Exception thrown when a BeanBag request fails.
 
        Data members:
          * msg      -- exception string, brief and human readable
-         * response -- response object
+         * response -- response object, or a ``CapturedResponse``
+                       summarising it if the BeanBag was created with
+                       ``capture_errors``, or None if no response was
+                       received (eg, a circuit breaker was open)
 
-       You can get the original request via bbe.response.request.
+       For a ``requests.Response``, you can get the original request via
+       bbe.response.request; a ``CapturedResponse`` only keeps its
+       ``url`` and ``method``.
     """
 
     __slots__ = ('msg', 'response')
@@ -32,3 +41,152 @@ class BeanBagException(Exception):
             msg = "%s - response: %s" % (self.msg, self.response.content)
         return msg
 
+
+class CapturedResponse(object):
+    """Summary of a response, kept instead of the response itself
+
+       Holds the parts of a ``requests.Response`` that are useful when
+       reporting an error, with the body truncated, so that exceptions
+       that are kept around (eg, logged or queued for retry) do not pin
+       large bodies or connections in memory.
+
+       Data members:
+         * status_code -- HTTP status code
+         * reason      -- HTTP reason phrase
+         * headers     -- dict of response headers
+         * content     -- first bytes of the response body
+         * truncated   -- True if content is only part of the body
+         * url         -- URL of the request
+         * method      -- HTTP method of the request
+    """
+
+    __slots__ = ('status_code', 'reason', 'headers', 'content', 'truncated',
+                 'url', 'method')
+
+    def __init__(self, response, limit=1024):
+        """Summarise and close a response
+
+           :param response: requests.Response object
+           :param limit: maximum number of bytes of the body to keep
+        """
+
+        self.status_code = getattr(response, "status_code", None)
+        self.reason = getattr(response, "reason", None)
+        self.headers = dict(getattr(response, "headers", None) or {})
+        self.url = getattr(response, "url", None)
+        request = getattr(response, "request", None)
+        self.method = getattr(request, "method", None)
+
+        body = b""
+        self.truncated = False
+        try:
+            if hasattr(response, "iter_content"):
+                for chunk in response.iter_content(limit + 1):
+                    body += chunk
+                    if len(body) > limit:
+                        break
+            else:
+                body = getattr(response, "content", b"") or b""
+        except Exception:
+            pass   # eg, the connection broke while reading the body
+        if not isinstance(body, bytes):
+            body = body.encode("utf-8")
+        if len(body) > limit:
+            body = body[:limit]
+            self.truncated = True
+        self.content = body
+
+        close = getattr(response, "close", None)
+        if close is not None:
+            close()
+
+    @property
+    def text(self):
+        """Body excerpt, decoded as utf-8"""
+
+        return self.content.decode("utf-8", "replace")
+
+    def __repr__(self):
+        return "<CapturedResponse [%s]>" % (self.status_code,)
+
+
+class ErrorAggregator(object):
+    """Count failed requests by endpoint and status
+
+       Passing an ErrorAggregator to a BeanBag as ``errors`` has each
+       request failure counted, keyed by method, URL template (see
+       ``beanbag.stats.endpoint``) and status code. Only the counts and
+       the most recent error message for each key are kept, so memory
+       use is bounded however many errors occur.
+
+       :Example:
+
+       >>> errors = ErrorAggregator()
+       >>> api = BeanBag("https://api.example.org/", errors=errors)
+       ...
+       >>> for (method, path, status), n in errors.most_common(5):
+       ...     print(n, method, path, status)
+    """
+
+    def __init__(self, max_keys=1000):
+        """Create an ErrorAggregator
+
+           :param max_keys: maximum number of distinct keys to track;
+                  errors for further keys are only counted in
+                  ``dropped``
+        """
+
+        self.max_keys = max_keys
+        self.counts = {}
+        self.messages = {}
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def add(self, response, msg=None, method=None, url=None):
+        """Count a failure
+
+           :param response: response (or CapturedResponse) for the failed
+                  request, or None
+           :param msg: description of the failure
+           :param method: HTTP method of the request, if not available
+                  from the response
+           :param url: URL of the request, if not available from the
+                  response
+        """
+
+        url = getattr(response, "url", None) or url
+        if method is None:
+            method = getattr(response, "method", None)
+        if method is None:
+            method = getattr(getattr(response, "request", None), "method",
+                             None)
+        key = (method, endpoint(url) if url else None,
+               getattr(response, "status_code", None))
+
+        with self.lock:
+            if key not in self.counts and len(self.counts) >= self.max_keys:
+                self.dropped += 1
+                return
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.messages[key] = msg
+
+    def most_common(self, n=None):
+        """List of (key, count) pairs, most frequent first"""
+
+        with self.lock:
+            items = sorted(self.counts.items(), key=lambda kv: -kv[1])
+        return items if n is None else items[:n]
+
+    def total(self):
+        """Total number of failures counted"""
+
+        with self.lock:
+            return sum(self.counts.values()) + self.dropped
+
+    def clear(self):
+        """Reset all counts"""
+
+        with self.lock:
+            self.counts.clear()
+            self.messages.clear()
+            self.dropped = 0
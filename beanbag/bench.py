@@ -0,0 +1,843 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Load generation and profiling for BeanBag clients.
+
+Run ``python -m beanbag.bench --help`` for options. By default, requests
+are made against a stub HTTP server run in a separate process, so that
+the CPU time and memory reported are the client's alone.
+"""
+
+from __future__ import print_function
+
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+__all__ = ['run', 'thread_scan', 'http2_benchmark', 'main']
+
+
+def _payload(payload_size):
+    """JSON list of records, roughly payload_size bytes long"""
+
+    record = dict(id=0, name="item", tags=["a", "b"], active=True, score=1.5)
+    per = len(json.dumps(record)) + 1
+    payload = json.dumps([dict(record, id=i)
+                          for i in range(max(1, payload_size // per))])
+    return payload.encode("utf-8")
+
+
+def _stub_server(port_queue, payload_size, delay=0):
+    """Serve JSON responses of roughly payload_size bytes (in a subprocess)
+
+       GET requests are answered after ``delay`` seconds.
+    """
+
+    try:
+        from BaseHTTPServer import BaseHTTPRequestHandler
+        from SocketServer import ThreadingMixIn, TCPServer as HTTPServer
+    except ImportError:
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from socketserver import ThreadingMixIn
+
+    payload = _payload(payload_size)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def reply(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_body(self):
+            n = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(n) if n else b""
+
+        def do_GET(self):
+            if delay:
+                time.sleep(delay)
+            if self.path.startswith("/echo/"):
+                self.reply(200, json.dumps(dict(path=self.path)).encode("utf-8"))
+            else:
+                self.reply(200, payload)
+
+        def do_POST(self):
+            body = self.read_body()
+            self.reply(201, ('{"received": %d}' % len(body)).encode("utf-8"))
+
+        do_PUT = do_PATCH = do_POST
+
+        def do_DELETE(self):
+            self.reply(204, b"")
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    srv = Server(("127.0.0.1", 0), Handler)
+    port_queue.put(srv.server_address[1])
+    srv.serve_forever()
+
+
+def _h2_stub_server(port_queue, payload_size, delay=0):
+    """Serve the stub server's responses over cleartext HTTP/2
+
+       Clients must use HTTP/2 with prior knowledge (eg,
+       ``HTTP2Session(http1=False)``). Each connection is handled by one
+       thread, which answers requests ``delay`` seconds after they
+       arrive, so slow requests on the same connection overlap. A GET of
+       ``/stats`` returns the number of connections accepted and the most
+       streams that were open at once on any one connection.
+    """
+
+    import heapq
+    import select
+    import socket
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.exceptions
+
+    payload = _payload(payload_size)
+    stats = dict(connections=0, max_streams=0)
+    lock = threading.Lock()
+
+    def respond(method, path, received):
+        if path == "/stats":
+            with lock:
+                return 200, json.dumps(stats).encode("utf-8")
+        if method == "GET":
+            if path.startswith("/echo/"):
+                return 200, json.dumps(dict(path=path)).encode("utf-8")
+            return 200, payload
+        if method == "DELETE":
+            return 204, b""
+        return 201, ('{"received": %d}' % (received,)).encode("utf-8")
+
+    def serve(sock):
+        config = h2.config.H2Configuration(client_side=False,
+                                           header_encoding="utf-8")
+        conn = h2.connection.H2Connection(config=config)
+        conn.initiate_connection()
+        sock.sendall(conn.data_to_send())
+
+        streams = {}    # stream id -> [method, path, bytes received]
+        due = []        # heap of (time, stream id) to respond to
+        sending = {}    # stream id -> response body still to send
+
+        while True:
+            timeout = None
+            if due:
+                timeout = max(0, due[0][0] - time.time())
+            if select.select([sock], [], [], timeout)[0]:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        headers = dict(event.headers)
+                        streams[event.stream_id] = [headers[":method"],
+                                                    headers[":path"], 0]
+                        with lock:
+                            stats["max_streams"] = max(stats["max_streams"],
+                                                       len(streams))
+                    elif isinstance(event, h2.events.DataReceived):
+                        streams[event.stream_id][2] += len(event.data)
+                        conn.acknowledge_received_data(
+                                event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        wait = delay if streams[event.stream_id][0] == "GET" else 0
+                        heapq.heappush(due, (time.time() + wait,
+                                             event.stream_id))
+                    elif isinstance(event, h2.events.StreamReset):
+                        streams.pop(event.stream_id, None)
+                        sending.pop(event.stream_id, None)
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+
+            while due and due[0][0] <= time.time():
+                t, sid = heapq.heappop(due)
+                if sid not in streams:
+                    continue
+                status, body = respond(*streams[sid])
+                conn.send_headers(sid, [(":status", str(status)),
+                                        ("content-type", "application/json"),
+                                        ("content-length", str(len(body)))])
+                sending[sid] = body
+
+            for sid in list(sending):
+                body = sending[sid]
+                while body:
+                    n = min(len(body), conn.local_flow_control_window(sid),
+                            conn.max_outbound_frame_size)
+                    if n <= 0:
+                        break
+                    conn.send_data(sid, body[:n])
+                    body = body[n:]
+                if body:
+                    sending[sid] = body
+                else:
+                    conn.end_stream(sid)
+                    del sending[sid]
+                    streams.pop(sid, None)
+
+            out = conn.data_to_send()
+            if out:
+                sock.sendall(out)
+
+    def handle(sock):
+        try:
+            serve(sock)
+        except (socket.error, h2.exceptions.ProtocolError):
+            pass
+        finally:
+            sock.close()
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1024)
+    port_queue.put(listener.getsockname()[1])
+    while True:
+        sock, addr = listener.accept()
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with lock:
+            stats["connections"] += 1
+        t = threading.Thread(target=handle, args=(sock,))
+        t.daemon = True
+        t.start()
+
+
+def _start(target, *args):
+    import multiprocessing
+    q = multiprocessing.Queue()
+    p = multiprocessing.Process(target=target, args=(q,) + args)
+    p.daemon = True
+    p.start()
+    return p, "http://127.0.0.1:%d/" % (q.get(timeout=30),)
+
+
+def start_stub(payload_size, delay=0):
+    """Start the stub server in a subprocess, returning (process, url)"""
+
+    return _start(_stub_server, payload_size, delay)
+
+
+def start_h2_stub(payload_size, delay=0):
+    """Start an HTTP/2 stub server in a subprocess, returning (process, url)
+
+       The server only speaks cleartext HTTP/2 with prior knowledge; see
+       ``HTTP2Session(http1=False)``.
+    """
+
+    return _start(_h2_stub_server, payload_size, delay)
+
+
+def parse_mix(mix):
+    """Parse "GET=8,POST=1" into [("GET", 8), ("POST", 1)]"""
+
+    res = []
+    for part in mix.split(","):
+        verb, _, weight = part.partition("=")
+        res.append((verb.strip().upper(), float(weight or 1)))
+    return res
+
+
+def load_replay(filename):
+    """Read a replay file: one JSON object per line with "method",
+       "path" and optionally "params" and "body" members"""
+
+    ops = []
+    with open(filename) as f:
+        for line in f:
+            if line.strip():
+                op = json.loads(line)
+                ops.append((op.get("method", "GET").upper(), op["path"],
+                            op.get("params") or {}, op.get("body")))
+    return ops
+
+
+def synthetic(mix, payload_size, n, seed=0):
+    """Generate n requests with the given mix of verbs"""
+
+    rng = random.Random(seed)
+    cumulative, total = [], 0
+    for verb, weight in mix:
+        total += weight
+        cumulative.append((total, verb))
+    body = {"data": "x" * max(0, payload_size - 12)}
+    ops = []
+    for i in range(n):
+        r = rng.random() * total
+        verb = next(v for w, v in cumulative if r < w)
+        if verb in ("GET", "DELETE"):
+            ops.append((verb, "items/%d" % (i % 100,), {}, None))
+        elif verb == "POST":
+            ops.append((verb, "items", {}, body))
+        else:
+            ops.append((verb, "items/%d" % (i % 100,), {}, body))
+    return ops
+
+
+def _resource(bb, path):
+    for el in path.strip("/").split("/"):
+        if el:
+            bb = bb[el]
+    return bb
+
+
+def _v2_caller(bb):
+    from . import v2
+    verbs = dict(GET=v2.GET, POST=v2.POST, PUT=v2.PUT, PATCH=v2.PATCH,
+                 DELETE=v2.DELETE, HEAD=v2.HEAD)
+
+    def call(verb, path, params, body):
+        url = _resource(bb, path)
+        if params:
+            url = url(**params)
+        if verb in ("GET", "DELETE", "HEAD") and body is None:
+            return verbs[verb](url)
+        return verbs[verb](url, body)
+    return call
+
+
+def _v1_caller(bb):
+    def call(verb, path, params, body):
+        res = _resource(bb, path)
+        if verb == "GET":
+            return res(**params)
+        return res(verb, body)
+    return call
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    i = int(round(pct / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[i]
+
+
+def _peak_rss():
+    """Peak resident set size of this process in bytes, or None"""
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+_cpu_time = getattr(time, "process_time", None) or time.clock
+_thread_time = getattr(time, "thread_time", None)
+
+
+def run(url, ops, api="v2", concurrency=8, warmup=0, profile=False):
+    """Make the requests in ops from concurrency threads
+
+       Returns a dict of results: requests, errors, elapsed, throughput,
+       latency percentiles (seconds), cpu_per_request (seconds) and
+       peak_rss (bytes). If profile is true, each thread is run under
+       cProfile, and the combined ``pstats.Stats`` are returned as
+       ``stats``. The profiles measure each thread's CPU time where
+       ``time.thread_time`` is available (``profile_clock`` is "cpu"),
+       and otherwise wall clock time, including time spent blocked
+       (``profile_clock`` is "wall").
+    """
+
+    if api == "v1":
+        from .v1 import BeanBag
+        bb = BeanBag(url, pool_size=concurrency, threadsafe=True)
+        call = _v1_caller(bb)
+    else:
+        from .v2 import BeanBag
+        bb = BeanBag(url, pool_size=concurrency, threadsafe=True)
+        call = _v2_caller(bb)
+
+    for op in ops[:warmup]:
+        call(*op)
+
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+    profiles = []
+
+    def worker():
+        if profile:
+            import cProfile
+            if _thread_time is not None:
+                prof = cProfile.Profile(_thread_time)
+            else:
+                prof = cProfile.Profile()
+            prof.enable()
+        mine = []
+        while True:
+            with lock:
+                i = next(counter)
+            if i >= len(ops):
+                break
+            start = time.time()
+            try:
+                call(*ops[i])
+            except Exception as e:
+                errors.append(e)
+            mine.append(time.time() - start)
+        if profile:
+            prof.disable()
+        with lock:
+            latencies.extend(mine)
+            if profile:
+                profiles.append(prof)
+
+    threads = [threading.Thread(target=worker) for i in range(concurrency)]
+    cpu = _cpu_time()
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    cpu = _cpu_time() - cpu
+
+    latencies.sort()
+    n = len(latencies)
+    res = dict(requests=n, errors=len(errors), elapsed=elapsed,
+               throughput=n / elapsed if elapsed else None,
+               p50=percentile(latencies, 50), p95=percentile(latencies, 95),
+               p99=percentile(latencies, 99),
+               cpu_per_request=cpu / n if n else None,
+               peak_rss=_peak_rss(),
+               first_error=repr(errors[0]) if errors else None)
+    if profiles:
+        import pstats
+        stats = pstats.Stats(profiles[0])
+        for prof in profiles[1:]:
+            stats.add(prof)
+        res["stats"] = stats
+        res["profile_clock"] = "cpu" if _thread_time is not None else "wall"
+    return res
+
+
+# where time goes: matched against profile entries' filenames and names
+categories = [
+    ("dispatch", ("beanbag/namespace.py", "beanbag/attrdict.py",
+                  "beanbag/v1.py", "beanbag/v2.py")),
+    ("codec", ("json", "beanbag/codec.py", "beanbag/compress.py",
+               "msgpack", "cbor2", "encodings/", "chardet", "charset_normalizer",
+               "zlib", "gzip")),
+    ("transport", ("beanbag/session.py", "beanbag/http2.py",
+                   "requests/", "urllib3/", "http/client.py", "httplib",
+                   "socket", "ssl", "select", "selectors", "email/")),
+]
+
+
+def categorise(filename, name=""):
+    """Classify a function as dispatch, codec, transport or other"""
+
+    where = filename.replace(os.sep, "/")
+    if where == "~":   # builtins: only the name is available
+        where = name
+    for cat, patterns in categories:
+        for p in patterns:
+            if p in where:
+                return cat
+    return "other"
+
+
+def profile_split(stats):
+    """Total own time per category, from a pstats.Stats object
+
+       Builtins and general purpose library functions (eg, ``os.stat``
+       or ``urllib.parse``) are counted in the category of whichever
+       caller spent the most time in them.
+    """
+
+    cats = {}
+
+    def category(func, seen=()):
+        if func in cats:
+            return cats[func]
+        filename, line, name = func
+        cat = categorise(filename, name)
+        if cat == "other" and func in stats.stats and func not in seen:
+            callers = stats.stats[func][4]
+            if callers:
+                caller = max(callers, key=lambda c: callers[c][2])
+                cat = category(caller, seen + (func,))
+        cats[func] = cat
+        return cat
+
+    split = dict((cat, 0.0) for cat, p in categories)
+    split["other"] = 0.0
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        split[category(func)] += tt
+    return split
+
+
+def memory_split(snapshot):
+    """Allocated bytes per category, from a tracemalloc snapshot"""
+
+    split = dict((cat, 0) for cat, p in categories)
+    split["other"] = 0
+    for stat in snapshot.statistics("filename"):
+        split[categorise(stat.traceback[0].filename)] += stat.size
+    return split
+
+
+def _echo_gets(call, nthreads, per_thread, check=True):
+    """GET echo/... from nthreads threads, returning (elapsed, errors)"""
+
+    errors = []
+
+    def worker(n):
+        for i in range(per_thread):
+            path = "echo/%d/%d" % (n, i)
+            try:
+                r = call("GET", path, {}, None)
+                if check and r["path"] != "/" + path:
+                    errors.append(r["path"])
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,))
+               for n in range(nthreads)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.time() - start, errors
+
+
+def thread_scan(url, api="v2", max_threads=64, requests=2000, check=True,
+                out=sys.stdout):
+    """Throughput of a threadsafe BeanBag with 1, 2, 4... max_threads threads
+
+       Each step makes ``requests`` GET requests shared between the
+       threads, and reports the request rate and the number of
+       connections opened. Returns a list of (threads, requests/s,
+       connections, errors).
+
+       :param check: check that each response matches its request (the
+              stub server echoes the paths of requests under ``echo/``)
+    """
+
+    from .pool import pool_stats
+
+    res = []
+    print("%7s %10s %8s %11s %7s" % ("threads", "requests", "req/s",
+                                     "connections", "errors"), file=out)
+    nthreads = 1
+    while nthreads <= max_threads:
+        if api == "v1":
+            from .v1 import BeanBag
+            bb = BeanBag(url, pool_size=nthreads, threadsafe=True)
+            call = _v1_caller(bb)
+        else:
+            from .v2 import BeanBag
+            bb = BeanBag(url, pool_size=nthreads, threadsafe=True)
+            call = _v2_caller(bb)
+        per_thread = max(1, requests // nthreads)
+        elapsed, errors = _echo_gets(call, nthreads, per_thread, check)
+
+        total = nthreads * per_thread
+        conns = sum(p["connections"] for p in pool_stats(bb))
+        res.append((nthreads, total / elapsed, conns, len(errors)))
+        print("%7d %10d %8.0f %11d %7d" % (nthreads, total, total / elapsed,
+                                          conns, len(errors)), file=out)
+        nthreads *= 2
+    return res
+
+
+def http2_benchmark(max_threads=64, requests=2000, payload_size=1024,
+                    delay=0.01, out=sys.stdout):
+    """Compare HTTP/1.1 and multiplexed HTTP/2 throughput
+
+       Starts HTTP/1.1 and HTTP/2 stub servers that answer each GET
+       after ``delay`` seconds, then for 1, 2, 4... max_threads threads
+       makes ``requests`` GETs via a threadsafe requests.Session and via
+       an ``HTTP2Session``, reporting the request rate, client CPU time
+       per request and connections opened for each. Returns a list of
+       (threads, protocol, requests/s, cpu per request, connections,
+       errors).
+    """
+
+    from .http2 import HTTP2Session
+    from .pool import pool_stats
+    from .v2 import BeanBag, GET
+
+    stub1, url1 = start_stub(payload_size, delay)
+    stub2, url2 = start_h2_stub(payload_size, delay)
+    res = []
+    try:
+        print("%7s %9s %8s %11s %11s %7s" % ("threads", "protocol", "req/s",
+              "cpu/request", "connections", "errors"), file=out)
+        nthreads = 1
+        while nthreads <= max_threads:
+            per_thread = max(1, requests // nthreads)
+            total = nthreads * per_thread
+            for proto in ("HTTP/1.1", "HTTP/2"):
+                if proto == "HTTP/2":
+                    session = HTTP2Session(http1=False)
+                    bb = BeanBag(url2, session=session)
+                    before = GET(bb.stats).connections
+                else:
+                    session = None
+                    bb = BeanBag(url1, pool_size=nthreads, threadsafe=True)
+
+                cpu = _cpu_time()
+                elapsed, errors = _echo_gets(_v2_caller(bb), nthreads,
+                                             per_thread)
+                cpu = (_cpu_time() - cpu) / total
+
+                if session is not None:
+                    # the first stats request opened the session's
+                    # connection; count any opened since
+                    conns = 1 + GET(bb.stats).connections - before
+                    session.close()
+                else:
+                    conns = sum(p["connections"] for p in pool_stats(bb))
+
+                res.append((nthreads, proto, total / elapsed, cpu, conns,
+                            len(errors)))
+                print("%7d %9s %8.0f %9.2fms %11d %7d" % (nthreads, proto,
+                      total / elapsed, cpu * 1000, conns, len(errors)),
+                      file=out)
+            nthreads *= 2
+    finally:
+        stub1.terminate()
+        stub2.terminate()
+    return res
+
+
+def decode_benchmark(sizes=(1, 4, 16), repeat=3, out=sys.stdout):
+    """Compare decoding JSON responses via response.text and as bytes
+
+       :param sizes: body sizes to test, in MB
+       :param repeat: decodes per measurement (the best time is used)
+    """
+
+    import requests
+    from . import codec
+
+    record = dict(id=0, name=u"Zo\u00eb", city=u"K\u00f8benhavn",
+                  tags=["a", "b"], score=1.5)
+    per = len(json.dumps(record)) + 1
+
+    def response(payload, ctype):
+        r = requests.Response()
+        r._content = payload
+        r.status_code = 200
+        r.headers["Content-Type"] = ctype
+        return r
+
+    def best(fn):
+        times = []
+        for i in range(repeat):
+            start = time.time()
+            fn()
+            times.append(time.time() - start)
+        return min(times)
+
+    methods = [
+        ("text, no charset", "application/vnd.api+json",
+         lambda r: json.loads(r.text)),
+        ("text, utf-8", "application/json", lambda r: json.loads(r.text)),
+        ("bytes", "application/json", codec.JSON.decode),
+    ]
+
+    print("%6s  %-18s %10s %10s" % ("MB", "method", "ms", "MB/s"), file=out)
+    for mb in sizes:
+        n = mb * 1048576 // per
+        payload = json.dumps([dict(record, id=i) for i in range(n)],
+                             ensure_ascii=False).encode("utf-8")
+        expected = None
+        for name, ctype, decode in methods:
+            result = []
+            t = best(lambda: result.append(decode(response(payload, ctype))))
+            if expected is None:
+                expected = result[0]
+            assert result[-1] == expected
+            print("%6.1f  %-18s %10.1f %10.1f" % (len(payload) / 1048576.0,
+                  name, t * 1000, len(payload) / 1048576.0 / t), file=out)
+
+
+def compress_benchmark(records=2000, repeat=5, out=sys.stdout):
+    """Compare the size and CPU cost of each available content encoding
+
+       :param records: number of records in the JSON payload
+       :param repeat: compressions and decompressions per measurement
+    """
+
+    from .compress import available, compressors, decompress
+
+    payload = json.dumps([dict(id=i, name="user%d" % i, active=i % 3 == 0,
+                               email="user%d@example.com" % i,
+                               tags=["alpha", "beta", "gamma"][:i % 4],
+                               score=i * 0.37)
+                          for i in range(records)]).encode("utf-8")
+
+    print("payload: %d bytes of JSON" % (len(payload),), file=out)
+    print("%-8s %5s %10s %7s %12s %12s" % ("encoding", "level", "bytes",
+                                           "ratio", "compress ms",
+                                           "decompress ms"), file=out)
+    for enc in available():
+        fn, default = compressors[enc]
+        for level in sorted(set([1, default, 9])):
+            start = time.time()
+            for i in range(repeat):
+                c = fn(payload, level)
+            ctime = (time.time() - start) / repeat
+            start = time.time()
+            for i in range(repeat):
+                d = decompress(c, enc)
+            dtime = (time.time() - start) / repeat
+            assert d == payload
+            print("%-8s %5d %10d %7.3f %12.2f %12.2f" % (enc, level, len(c),
+                  float(len(c)) / len(payload), ctime * 1000, dtime * 1000),
+                  file=out)
+
+
+def report(res, out=sys.stdout):
+    ms = lambda s: "-" if s is None else "%.2fms" % (s * 1000,)
+    print("requests:     %d (%d errors)" % (res["requests"], res["errors"]),
+          file=out)
+    if res.get("first_error"):
+        print("first error:  %s" % (res["first_error"],), file=out)
+    print("elapsed:      %.2fs" % (res["elapsed"],), file=out)
+    print("throughput:   %.1f req/s" % (res["throughput"] or 0,), file=out)
+    print("latency:      p50 %s  p95 %s  p99 %s" % (ms(res["p50"]),
+          ms(res["p95"]), ms(res["p99"])), file=out)
+    print("cpu/request:  %s" % (ms(res["cpu_per_request"]),), file=out)
+    if res["peak_rss"] is not None:
+        print("peak rss:     %.1fMB" % (res["peak_rss"] / 1048576.0,),
+              file=out)
+    titles = dict(profile="profile split (per-thread %s time)"
+                          % (res.get("profile_clock", "wall"),),
+                  memory="memory split")
+    for key, unit in (("profile", "s"), ("memory", "B")):
+        if key in res:
+            total = sum(res[key].values()) or 1
+            print("%s:" % (titles[key],), file=out)
+            for cat, v in sorted(res[key].items(), key=lambda kv: -kv[1]):
+                print("  %-10s %12.3f%s %5.1f%%" % (cat, v, unit,
+                      100.0 * v / total), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m beanbag.bench",
+            description="Measure the request rate a BeanBag client sustains")
+    parser.add_argument("--api", choices=["v1", "v2"], default="v2")
+    parser.add_argument("--url", help="server to test against (default: "
+                        "start a local stub server)")
+    parser.add_argument("--replay", metavar="FILE", help="JSON lines file "
+                        "of requests to make, instead of a synthetic mix")
+    parser.add_argument("-c", "--concurrency", type=int, default=8)
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("--mix", default="GET=8,POST=1,PUT=1",
+                        help="verbs and relative weights (default: %(default)s)")
+    parser.add_argument("--payload-size", type=int, default=1024,
+                        help="bytes in request bodies and stub server "
+                        "GET responses (default: %(default)s)")
+    parser.add_argument("--warmup", type=int, default=0,
+                        help="requests to make before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", metavar="FILE",
+                        help="run under cProfile, saving stats to FILE")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="trace memory allocations")
+    parser.add_argument("--json", action="store_true",
+                        help="print results as JSON")
+    parser.add_argument("--threads", type=int, metavar="MAX",
+                        help="instead of the request mix, measure GET "
+                        "throughput with 1, 2, 4... MAX threads")
+    parser.add_argument("--http2", action="store_true",
+                        help="instead of the request mix, compare GET "
+                        "throughput over HTTP/1.1 and HTTP/2 with 1, 2, "
+                        "4... --concurrency threads")
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="seconds the stub server waits before "
+                        "answering each GET (default: %(default)s; "
+                        "0.01 for --http2)")
+    parser.add_argument("--decode", action="store_true",
+                        help="instead of making requests, compare ways "
+                        "of decoding multi-MB JSON bodies")
+    parser.add_argument("--compress", action="store_true",
+                        help="instead of making requests, compare the "
+                        "size and speed of each content encoding")
+    args = parser.parse_args(argv)
+
+    if args.decode:
+        decode_benchmark()
+        return 0
+
+    if args.compress:
+        compress_benchmark()
+        return 0
+
+    if args.http2:
+        res = http2_benchmark(args.concurrency, args.requests,
+                              args.payload_size, args.delay or 0.01)
+        return 0 if not any(r[-1] for r in res) else 1
+
+    stub = None
+    url = args.url
+    if url is None:
+        stub, url = start_stub(args.payload_size, args.delay)
+
+    if args.threads:
+        try:
+            res = thread_scan(url, args.api, args.threads, args.requests,
+                              check=stub is not None)
+        finally:
+            if stub is not None:
+                stub.terminate()
+        return 0 if not any(errors for n, rate, c, errors in res) else 1
+
+    if args.replay:
+        ops = load_replay(args.replay)
+        ops = list(itertools.islice(itertools.cycle(ops), args.requests))
+    else:
+        ops = synthetic(parse_mix(args.mix), args.payload_size,
+                        args.requests, args.seed)
+
+    if args.tracemalloc:
+        import tracemalloc
+        tracemalloc.start()
+
+    try:
+        res = run(url, ops, args.api, args.concurrency, args.warmup,
+                  profile=bool(args.profile))
+        if args.profile:
+            stats = res.pop("stats")
+            stats.dump_stats(args.profile)
+            res["profile"] = profile_split(stats)
+        if args.tracemalloc:
+            res["memory"] = memory_split(tracemalloc.take_snapshot())
+    finally:
+        if stub is not None:
+            stub.terminate()
+
+    if args.json:
+        json.dump(res, sys.stdout, indent=2, sort_keys=True)
+        print()
+    else:
+        report(res)
+    return 0 if not res["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
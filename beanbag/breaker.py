@@ -0,0 +1,200 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Per-endpoint circuit breakers, failing fast when a backend is bad."""
+
+from .bbexcept import BeanBagException
+from .session import SessionWrapper
+from .stats import endpoint
+
+import collections
+import threading
+import time
+
+__all__ = ['CircuitBreaker', 'BreakerSession']
+
+
+class CircuitBreaker(object):
+    """Circuit breaker for a single endpoint.
+
+       The breaker starts out "closed", letting requests through and
+       recording the outcome of the last ``window`` of them. Once at
+       least ``min_requests`` have been seen, if the proportion of
+       failures (exceptions, 5xx responses and 429s) reaches
+       ``error_rate``, or the proportion taking longer than
+       ``slow_call`` seconds reaches ``slow_rate``, the breaker "opens"
+       and requests are refused immediately.
+
+       After ``open_time`` seconds the breaker becomes "half-open" and
+       lets ``probes`` requests through. If they all succeed, the breaker
+       closes again; if any fails, it reopens for another ``open_time``.
+
+       Data members:
+         * state   -- "closed", "open" or "half-open"
+         * opened  -- number of times the breaker has opened
+         * refused -- number of requests refused while open
+    """
+
+    def __init__(self, window=20, min_requests=10, error_rate=0.5,
+                 slow_call=None, slow_rate=0.5, open_time=30.0, probes=1):
+        """Create a CircuitBreaker
+
+           :param window: number of recent requests to consider
+           :param min_requests: don't open until this many requests have
+                  been seen
+           :param error_rate: open when this proportion of requests fail
+           :param slow_call: requests taking longer than this many seconds
+                  count as slow (None to ignore latency)
+           :param slow_rate: open when this proportion of requests are slow
+           :param open_time: seconds to refuse requests before probing
+           :param probes: successful requests needed to close again
+        """
+
+        self.window = window
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_time = open_time
+        self.probes = probes
+
+        self.state = "closed"
+        self.outcomes = collections.deque(maxlen=window)  # (ok, slow)
+        self.open_until = 0
+        self.probing = 0
+        self.probed = 0
+        self.opened = 0
+        self.refused = 0
+        self.lock = threading.Lock()
+        self.time = time.time
+
+    def _open(self, now):
+        self.state = "open"
+        self.open_until = now + self.open_time
+        self.opened += 1
+        self.outcomes.clear()
+
+    def allow(self):
+        """Whether a request may be made now
+
+           A True result must be followed by a call to ``record()``.
+        """
+
+        with self.lock:
+            if self.state == "open":
+                now = self.time()
+                if now < self.open_until:
+                    self.refused += 1
+                    return False
+                self.state = "half-open"
+                self.probing = self.probed = 0
+            if self.state == "half-open":
+                if self.probing >= self.probes:
+                    self.refused += 1
+                    return False
+                self.probing += 1
+            return True
+
+    def record(self, ok, latency):
+        """Record the outcome of a request
+
+           :param ok: False if the request failed
+           :param latency: how long the request took, in seconds
+        """
+
+        slow = self.slow_call is not None and latency > self.slow_call
+        with self.lock:
+            now = self.time()
+            if self.state == "half-open":
+                if not ok or slow:
+                    self._open(now)
+                    return
+                self.probed += 1
+                if self.probed >= self.probes:
+                    self.state = "closed"
+                    self.outcomes.clear()
+                return
+            if self.state == "open":
+                return   # request started before the breaker opened
+
+            self.outcomes.append((ok, slow))
+            n = len(self.outcomes)
+            if n < self.min_requests:
+                return
+            failed = sum(1 for o, s in self.outcomes if not o)
+            slowed = sum(1 for o, s in self.outcomes if s)
+            if (failed >= self.error_rate * n or
+                    (self.slow_call is not None and
+                     slowed >= self.slow_rate * n)):
+                self._open(now)
+
+    def stats(self):
+        """Current state and counts, as a dict"""
+
+        with self.lock:
+            n = len(self.outcomes)
+            failed = sum(1 for o, s in self.outcomes if not o)
+            return dict(state=self.state, requests=n, failed=failed,
+                        opened=self.opened, refused=self.refused)
+
+
+class BreakerSession(SessionWrapper):
+    """Session wrapper with a circuit breaker per endpoint
+
+       Endpoints are identified by host and URL template (see
+       ``beanbag.stats.endpoint``), so ``/users/12`` and ``/users/13``
+       share a breaker, while ``/users/12/posts`` has its own. When an
+       endpoint's breaker is open, requests to it raise a
+       ``BeanBagException`` immediately, without waiting on the backend;
+       BeanBags re-raise it via ``error()``, so it is counted by their
+       ``ErrorAggregator``.
+
+       :Example:
+
+       >>> session = BreakerSession(requests.Session(), slow_call=2.0)
+       >>> bb = beanbag.v2.BeanBag("http://hostname/api/", session=session)
+       >>> session.stats()
+       {'http://hostname/api/users/{id}': {'state': 'open', ...}}
+
+       Keyword arguments other than ``session`` are passed to the
+       ``CircuitBreaker`` created for each endpoint.
+    """
+
+    def __init__(self, session=None, **kwargs):
+        SessionWrapper.__init__(self, session)
+        self.breaker_args = kwargs
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, url):
+        """The CircuitBreaker for a URL's endpoint"""
+
+        key = endpoint(url)
+        with self.lock:
+            b = self.breakers.get(key)
+            if b is None:
+                b = self.breakers[key] = CircuitBreaker(**self.breaker_args)
+        return b
+
+    def request(self, method, url, **kwargs):
+        b = self.breaker(url)
+        if not b.allow():
+            raise BeanBagException(None,
+                    "Circuit open for %s" % (endpoint(url),))
+
+        start = time.time()
+        ok = False
+        try:
+            res = self.session.request(method, url, **kwargs)
+            ok = res.status_code < 500 and res.status_code != 429
+            return res
+        finally:
+            b.record(ok, time.time() - start)
+
+    def stats(self):
+        """Breaker state for each endpoint seen"""
+
+        with self.lock:
+            breakers = list(self.breakers.items())
+        return dict((key, b.stats()) for key, b in breakers)
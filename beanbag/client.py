@@ -0,0 +1,109 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Session setup, error reporting and tracing shared by v1 and v2."""
+
+from .namespace import Namespace
+from .bbexcept import BeanBagException, CapturedResponse
+from .balance import BalancedSession
+from .session import ThreadLocalSession
+from .trace import nospan
+from . import pool
+
+__all__ = ['Client']
+
+
+class Client(Namespace):
+    """Namespace mixin with the plumbing common to v1 and v2 BeanBags
+
+       Subclasses call ``setup()`` from their ``__init__``, and use
+       ``error()`` to create exceptions and ``span()`` and
+       ``trace_request()`` to trace requests. Their ``str(path)`` method
+       must give the URL of a resource.
+    """
+
+    def setup(self, base_url, session=None, pool_size=None, pool_block=False,
+              threadsafe=False, tracer=None, capture_errors=False,
+              errors=None):
+        """Set up the session, base URL, tracing and error handling
+
+           :param base_url: the base URL prefix for all resources, or a
+                  list of equivalent base URLs to balance requests across
+           :param session: requests.Session instance used for this API, or
+                  None to create one
+           :param pool_size: maximum number of connections to keep open
+                  to each host (see ``beanbag.pool``); requests' default
+                  of 10 is used if None
+           :param pool_block: if true, wait for a pooled connection
+                  rather than opening extra, unpooled ones
+           :param threadsafe: if true, give each thread its own
+                  requests.Session sharing this one's configuration and
+                  connection pool (see ``beanbag.session``), so the BeanBag
+                  can be used from many threads at once
+           :param tracer: ``beanbag.trace.Tracer`` to record spans for
+                  each request in, or None
+           :param capture_errors: if true, exceptions hold a
+                  ``CapturedResponse`` summary (with at most 1024 bytes of
+                  the body, or this many if an integer) instead of the
+                  response itself, and the response is closed
+           :param errors: ``ErrorAggregator`` to count failures in, or None
+        """
+
+        if session is None:
+            import requests
+            session = requests.Session()
+
+        if pool_size is not None:
+            urls = base_url
+            if not isinstance(urls, (list, tuple, set, frozenset)):
+                urls = [urls]
+            pool.configure(session, list(urls), pool_size, pool_block)
+
+        if threadsafe:
+            session = ThreadLocalSession(session)
+
+        if isinstance(base_url, (list, tuple, set, frozenset)):
+            session = BalancedSession(session, base_url)
+            base_url = session.base_urls[0]
+
+        self.base_url = base_url.rstrip("/") + "/"
+        self.session = session
+        self.tracer = tracer
+        self.capture_errors = capture_errors
+        self.errors = errors
+
+    def error(self, response, msg, method=None, url=None):
+        """Exception to raise for a failed request
+
+           Counts the failure in ``errors``, and summarises the response
+           if ``capture_errors`` is set. ``method`` and ``url`` describe
+           the request when the response (if any) doesn't.
+        """
+
+        if self.errors is not None:
+            self.errors.add(response, msg, method, url)
+        if self.capture_errors and response is not None:
+            limit = self.capture_errors
+            if limit is True:
+                limit = 1024
+            response = CapturedResponse(response, limit)
+            if response.method is None:
+                response.method = method
+            if response.url is None:
+                response.url = url
+        return BeanBagException(response, msg)
+
+    def span(self, name):
+        """Tracing span for part of a request (see ``beanbag.trace``)"""
+
+        if self.tracer is None:
+            return nospan
+        return self.tracer.span(name)
+
+    def trace_request(self, path, verb):
+        """Tracing span for a whole request to a resource"""
+
+        if self.tracer is None:
+            return nospan
+        return self.tracer.request(verb, self.str(path))
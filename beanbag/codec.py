@@ -0,0 +1,154 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Content formats that v2 BeanBags can send and receive."""
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+__all__ = ['Codec', 'JSON', 'MSGPACK', 'CBOR', 'lookup']
+
+
+class Formatted(object):
+    """A request body tagged with the codec to encode it with"""
+
+    def __init__(self, codec, body):
+        self.codec = codec
+        self.body = body
+
+
+class Codec(object):
+    """A content format: a MIME type with encode and decode functions.
+
+       Calling a codec on a request body marks that body to be sent in
+       this format, overriding the BeanBag's default for one request, and
+       also makes it the preferred format for the response:
+
+       >>> POST(bb.items, MSGPACK({"a": 1}))
+       >>> GET(bb.items[3], CBOR(None))
+    """
+
+    def __init__(self, name, mime, dumps, loads, aliases=()):
+        """Create a Codec
+
+           :param name: short name, eg "json"
+           :param mime: content type, eg "application/json"
+           :param dumps: function converting a python object to str/bytes
+           :param loads: function converting bytes to a python object
+           :param aliases: other content types this codec can decode
+        """
+
+        self.name = name
+        self.mime = mime
+        self.dumps = dumps
+        self.loads = loads
+        self.mimes = (mime,) + tuple(aliases)
+
+    def __call__(self, body):
+        return Formatted(self, body)
+
+    def __repr__(self):
+        return "<Codec(%s)>" % (self.name,)
+
+    def encode(self, obj):
+        """Encode a python object as a request body"""
+
+        return self.dumps(obj)
+
+    def decode(self, response):
+        """Decode the body of a requests.Response"""
+
+        return self.loads(response.content)
+
+
+def _msgpack_dumps(obj):
+    import msgpack
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def _msgpack_loads(data):
+    import msgpack
+    return msgpack.unpackb(data, raw=False)
+
+
+def _cbor_dumps(obj):
+    import cbor2
+    return cbor2.dumps(obj)
+
+
+def _cbor_loads(data):
+    import cbor2
+    return cbor2.loads(data)
+
+
+def charset(response):
+    """Charset given in a response's Content-Type header, or None"""
+
+    ctype = response.headers.get("content-type") or ""
+    for param in ctype.split(";")[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset":
+            return value.strip().strip("'\"").lower()
+    return None
+
+
+# charsets json.loads() detects itself when given bytes (RFC 8259 / 4627)
+_json_charsets = frozenset("utf8 utf16 utf16le utf16be utf32 utf32le "
+                           "utf32be ascii usascii".split())
+
+
+try:
+    json.loads(b"0")
+    _bytes_json = True
+except TypeError:   # Python 3 before 3.6 only parses str
+    _bytes_json = False
+
+
+class JSONCodec(Codec):
+    def decode(self, response):
+        """Decode a JSON response body directly from its bytes
+
+           Unless the response declares a charset that isn't a Unicode
+           encoding, the body is parsed as bytes, avoiding
+           ``response.text``'s charset detection and an extra copy of the
+           body as a str. If the declared charset is unknown or can't
+           decode the body, it is ignored and the body parsed as bytes.
+        """
+
+        content = response.content
+        cs = charset(response)
+        if isinstance(content, bytes):
+            if cs is not None and (cs.replace("-", "").replace("_", "")
+                                   not in _json_charsets):
+                try:
+                    content = content.decode(cs)
+                except (LookupError, UnicodeDecodeError):
+                    cs = None
+            if isinstance(content, bytes) and not _bytes_json:
+                content = content.decode(cs or "utf-8")
+        return self.loads(content)
+
+
+JSON = JSONCodec("json", "application/json", json.dumps, json.loads)
+MSGPACK = Codec("msgpack", "application/msgpack",
+                _msgpack_dumps, _msgpack_loads,
+                aliases=("application/x-msgpack", "application/vnd.msgpack"))
+CBOR = Codec("cbor", "application/cbor", _cbor_dumps, _cbor_loads)
+
+codecs = dict((c.name, c) for c in (JSON, MSGPACK, CBOR))
+
+
+def lookup(fmt):
+    """Find a codec by name ("json", "msgpack", "cbor") or content type"""
+
+    if isinstance(fmt, Codec):
+        return fmt
+    if fmt in codecs:
+        return codecs[fmt]
+    for c in codecs.values():
+        if fmt in c.mimes:
+            return c
+    raise ValueError("unknown content format: %s" % (fmt,))
@@ -0,0 +1,134 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Request body compression and response decompression helpers.
+
+Running ``python -m beanbag.bench --compress`` prints a comparison of the
+available encodings on a typical JSON payload.
+"""
+
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__all__ = ['available', 'accept_encoding', 'compress', 'decompress',
+           'decompress_response']
+
+
+def _gzip(data, level):
+    c = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return c.compress(data) + c.flush()
+
+
+def _deflate(data, level):
+    return zlib.compress(data, level)
+
+
+def _gunzip(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def _inflate(data):
+    try:
+        return zlib.decompress(data)
+    except zlib.error:
+        return zlib.decompress(data, -zlib.MAX_WBITS)
+
+
+compressors = {
+    "gzip": (_gzip, 6),
+    "deflate": (_deflate, 6),
+}
+
+decompressors = {
+    "gzip": _gunzip,
+    "deflate": _inflate,
+}
+
+if brotli is not None:
+    compressors["br"] = (lambda data, level: brotli.compress(data, quality=level), 5)
+    decompressors["br"] = brotli.decompress
+
+if zstandard is not None:
+    compressors["zstd"] = (lambda data, level: zstandard.ZstdCompressor(level).compress(data), 3)
+    decompressors["zstd"] = lambda data: (
+            zstandard.ZstdDecompressor().decompressobj().decompress(data))
+
+
+def available():
+    """Encodings that can be used to compress request bodies"""
+
+    return [e for e in ("zstd", "br", "gzip", "deflate") if e in compressors]
+
+
+def accept_encoding():
+    """Value for an Accept-Encoding header listing decodable encodings"""
+
+    return ", ".join(e for e in ("gzip", "deflate", "br", "zstd")
+                     if e in decompressors)
+
+
+def compress(data, encoding, level=None):
+    """Compress a request body
+
+       :param data: str or bytes to compress
+       :param encoding: content encoding, eg "gzip", "br" or "zstd"
+       :param level: compression level (encoding specific default if None)
+    """
+
+    if encoding not in compressors:
+        raise ValueError("unsupported content encoding: %s" % (encoding,))
+    fn, default = compressors[encoding]
+    if not isinstance(data, bytes):
+        data = data.encode("utf-8")
+    return fn(data, default if level is None else level)
+
+
+def decompress(data, encoding):
+    """Decompress a body encoded with the given content encoding"""
+
+    if encoding not in decompressors:
+        raise ValueError("unsupported content encoding: %s" % (encoding,))
+    return decompressors[encoding](data)
+
+
+def _transport_encodings():
+    try:
+        from urllib3.util.request import ACCEPT_ENCODING
+    except ImportError:
+        return frozenset(["gzip", "deflate"])
+    return frozenset(e.strip() for e in ACCEPT_ENCODING.split(","))
+
+transport_encodings = _transport_encodings()
+
+
+def decompress_response(response):
+    """Decode a requests.Response body the transport left compressed
+
+       urllib3 only decodes the content encodings it knows about (which
+       may not include zstd), and leaves the body untouched otherwise.
+       In that case the body is decompressed in place, so that
+       ``response.content`` and ``response.text`` give the decoded body.
+    """
+
+    enc = response.headers.get("content-encoding")
+    if not enc:
+        return response
+    enc = enc.strip().lower()
+    if enc in transport_encodings or enc not in decompressors:
+        return response
+    import requests
+    if isinstance(response, requests.Response):
+        response._content = decompress(response.content, enc)
+        del response.headers["content-encoding"]
+    return response
+
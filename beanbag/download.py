@@ -0,0 +1,190 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Download large binary resources, in parallel where possible."""
+
+from .v2 import Request
+
+from concurrent import futures
+import json
+import mmap
+import os
+import re
+import threading
+
+__all__ = ['DOWNLOAD']
+
+
+def _request(headers=None):
+    h = {"Accept": "*/*", "Accept-Encoding": "identity"}
+    if headers:
+        h.update(headers)
+    return Request(headers=h, stream=True)
+
+
+def _check(base, response, method, expected=None):
+    ok = (200 <= response.status_code < 300 if expected is None
+          else response.status_code == expected)
+    if not ok:
+        raise base.error(response,
+                "Bad response code: %d" % (response.status_code,), method)
+
+
+def _validator(headers):
+    """If-Range value for a resource: a strong ETag, or Last-Modified
+
+       Weak ETags (``W/"..."``) can't be used with If-Range (RFC 7233).
+    """
+
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("last-modified")
+
+
+_content_range = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)$")
+
+
+class _State(object):
+    """Progress of a ranged download, kept alongside the partial file so
+       an interrupted download can be resumed."""
+
+    def __init__(self, filename, size, etag):
+        self.filename = filename
+        self.size = size
+        self.etag = etag   # ETag or Last-Modified, to detect changes
+        self.done = set()
+        self.lock = threading.Lock()
+
+    def load(self, partfile):
+        try:
+            with open(self.filename) as f:
+                st = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        if (st.get("size") == self.size and st.get("etag") == self.etag
+                and os.path.exists(partfile)
+                and os.path.getsize(partfile) == self.size):
+            self.done = set(tuple(r) for r in st.get("done", ()))
+
+    def complete(self, rng):
+        with self.lock:
+            self.done.add(rng)
+            with open(self.filename, "w") as f:
+                json.dump(dict(size=self.size, etag=self.etag,
+                               done=sorted(self.done)), f)
+
+
+def _fetch_range(base, path, rng, validator, size, view, chunk_size):
+    start, end = rng
+    headers = {"Range": "bytes=%d-%d" % (start, end)}
+    if validator:
+        headers["If-Range"] = validator
+    res = base.make_request(path, "GET", _request(headers))
+    try:
+        if res.status_code == 200:
+            raise base.error(res,
+                    "Resource changed or range not honoured during download",
+                    "GET")
+        _check(base, res, "GET", 206)
+        m = _content_range.match(res.headers.get("content-range", "").strip())
+        if (m is None or (int(m.group(1)), int(m.group(2))) != rng
+                or m.group(3) not in ("*", str(size))):
+            raise base.error(res,
+                    "Resource changed or wrong range returned during download",
+                    "GET")
+        pos = start
+        for chunk in res.iter_content(chunk_size):
+            n = len(chunk)
+            if pos + n > end + 1:
+                raise base.error(res, "Range response too long", "GET")
+            view[pos:pos + n] = chunk
+            pos += n
+        if pos != end + 1:
+            raise base.error(res, "Range response truncated", "GET")
+    finally:
+        res.close()
+
+
+def _download_single(base, path, filename, chunk_size):
+    res = base.make_request(path, "GET", _request())
+    try:
+        _check(base, res, "GET")
+        partfile = filename + ".part"
+        with open(partfile, "wb") as f:
+            for chunk in res.iter_content(chunk_size):
+                f.write(chunk)
+    finally:
+        res.close()
+    os.rename(partfile, filename)
+
+
+def DOWNLOAD(url, filename, parallel=4, part_size=8 << 20,
+             chunk_size=64 << 10):
+    """Download a resource's raw body to a file
+
+       If a ``HEAD`` request indicates the server supports byte ranges,
+       the resource is split into ``part_size`` ranges that are fetched
+       by ``parallel`` threads, each writing directly into a memory
+       mapped, preallocated ``filename + ".part"`` file. Progress is
+       recorded in ``filename + ".part.json"`` so that calling
+       ``DOWNLOAD`` again after an interruption only fetches the missing
+       ranges. Servers without range support are downloaded as a single
+       stream. Once complete, the file is renamed to ``filename``.
+
+       Ranges are requested with an ``If-Range`` header holding the
+       resource's strong ETag, or failing that its Last-Modified date,
+       and each response's ``Content-Range`` is checked, so that a
+       resource changing mid-download is detected.
+
+       :param url: BeanBag URL of the resource
+       :param filename: local filename to write to
+       :param parallel: number of ranges to fetch at once
+       :param part_size: size in bytes of each range
+       :param chunk_size: size of reads from each response
+    """
+
+    base, path = ~url
+
+    head = base.make_request(path, "HEAD", _request())
+    head.close()
+    _check(base, head, "HEAD")
+
+    size = int(head.headers.get("content-length", 0))
+    ranged = head.headers.get("accept-ranges", "").lower() == "bytes"
+    if not ranged or size == 0:
+        _download_single(base, path, filename, chunk_size)
+        return filename
+
+    partfile = filename + ".part"
+    validator = _validator(head.headers)
+    state = _State(filename + ".part.json", size,
+                   head.headers.get("etag") or validator)
+    state.load(partfile)
+    if not state.done:
+        with open(partfile, "wb") as f:
+            f.truncate(size)
+
+    todo = [(s, min(s + part_size, size) - 1)
+            for s in range(0, size, part_size)]
+    todo = [r for r in todo if r not in state.done]
+
+    with open(partfile, "r+b") as f:
+        mm = mmap.mmap(f.fileno(), size)
+        try:
+            def fetch(rng):
+                _fetch_range(base, path, rng, validator, size, mm,
+                             chunk_size)
+                state.complete(rng)
+
+            with futures.ThreadPoolExecutor(max(1, parallel)) as ex:
+                for fut in [ex.submit(fetch, r) for r in todo]:
+                    fut.result()
+            mm.flush()
+        finally:
+            mm.close()
+
+    os.rename(partfile, filename)
+    os.remove(state.filename)
+    return filename
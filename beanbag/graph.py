@@ -0,0 +1,160 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Run a graph of dependent v2 requests with as much parallelism as
+possible."""
+
+from .snapshot import wrap
+
+from concurrent import futures
+
+__all__ = ['Graph']
+
+
+def _resolve(x, args):
+    """Call x with dependency results, unless it is a plain value"""
+
+    if hasattr(x, ".path") or not callable(x):
+        return x   # BeanBag URLs are callable, but are used as is
+    return x(*args)
+
+
+class Node(object):
+    """A request in a Graph; use as a key into the results of run()"""
+
+    def __init__(self, verb, url, body, deps, each):
+        self.verb = verb
+        self.url = url
+        self.body = body
+        self.deps = tuple(deps)
+        self.each = each
+
+    def __repr__(self):
+        return "<Node(%s %r)>" % (getattr(self.verb, "__name__", self.verb),
+                                  self.url)
+
+
+class Graph(object):
+    """A set of requests, some depending on the results of others.
+
+       :Example:
+
+       >>> g = Graph(max_workers=8)
+       >>> me = g.add(GET, gh.user)
+       >>> repos = g.add(GET, lambda me: gh.users[me.login].repos, me)
+       >>> stars = g.map(GET, lambda r: gh.repos[r.owner.login][r.name].stargazers,
+       ...               repos)
+       >>> results = g.run()
+       >>> for repo, who in zip(results[repos], results[stars]):
+       ...     print(repo.name, len(who))
+
+       A request's URL and body may be given directly, or as functions
+       that are called with the results of the nodes it depends on. Every
+       request whose dependencies have completed is run concurrently, up
+       to ``max_workers`` at a time.
+    """
+
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.nodes = []
+
+    def add(self, verb, url, *deps, **kwargs):
+        """Add a request to the graph
+
+           :param verb: v2 verb function, eg GET or POST
+           :param url: BeanBag URL, or function taking the results of
+                  deps and returning one
+           :param deps: nodes whose results this request depends on
+           :param body: request body, or function taking the results of
+                  deps and returning one
+        """
+
+        node = Node(verb, url, kwargs.pop("body", None), deps, False)
+        if kwargs:
+            raise TypeError("unexpected keyword arguments: %s"
+                            % (", ".join(kwargs),))
+        self.nodes.append(node)
+        return node
+
+    def map(self, verb, url, dep, body=None):
+        """Add one request per item of another node's result
+
+           The result of this node is the list of each request's result,
+           in the same order as the items they were made for.
+
+           :param verb: v2 verb function, eg GET or POST
+           :param url: function taking an item and returning a BeanBag URL
+           :param dep: node whose result is iterated over
+           :param body: request body, or function taking an item and
+                  returning one
+        """
+
+        node = Node(verb, url, body, (dep,), True)
+        self.nodes.append(node)
+        return node
+
+    def _call(self, node, args):
+        return node.verb(_resolve(node.url, args), _resolve(node.body, args))
+
+    def _start(self, ex, call, ready, waiting, results, running, partial):
+        for node in ready:
+            waiting.remove(node)
+            args = [results[d] for d in node.deps]
+            if not node.each:
+                fut = ex.submit(call, node, args)
+                running[fut] = (node, None)
+                continue
+            items = list(args[0] or ())
+            if not items:
+                results[node] = []
+                continue
+            partial[node] = [[None] * len(items), len(items)]
+            for i, item in enumerate(items):
+                fut = ex.submit(call, node, [item])
+                running[fut] = (node, i)
+
+    def run(self):
+        """Run every request, returning a dict mapping nodes to results"""
+
+        results = {}
+        waiting = list(self.nodes)
+        running = {}     # future -> (node, index)
+        partial = {}     # map node -> [results, outstanding]
+        call = wrap(self._call)   # keep any beanbag.snapshot active
+
+        with futures.ThreadPoolExecutor(self.max_workers) as ex:
+            try:
+                while waiting or running:
+                    ready = True
+                    while ready:
+                        ready = [n for n in waiting
+                                 if all(d in results for d in n.deps)]
+                        self._start(ex, call, ready, waiting, results,
+                                    running, partial)
+
+                    if not running:
+                        if waiting:
+                            raise ValueError("unsatisfiable dependencies: %r"
+                                             % (waiting,))
+                        break
+
+                    done, _ = futures.wait(running,
+                                           return_when=futures.FIRST_COMPLETED)
+                    for fut in done:
+                        node, i = running.pop(fut)
+                        res = fut.result()
+                        if i is None:
+                            results[node] = res
+                            continue
+                        p = partial[node]
+                        p[0][i] = res
+                        p[1] -= 1
+                        if p[1] == 0:
+                            results[node] = partial.pop(node)[0]
+            except:
+                for fut in running:
+                    fut.cancel()
+                raise
+
+        return results
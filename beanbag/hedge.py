@@ -0,0 +1,167 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Hedged requests: reduce tail latency by racing a second request."""
+
+from .session import SessionWrapper
+from .stats import endpoint, EndpointStats, LatencyWindow
+
+from concurrent import futures
+import threading
+import time
+
+__all__ = ['HedgePolicy', 'HedgedSession']
+
+
+class HedgePolicy(object):
+    """Decides when to send a hedge request, and keeps count of them.
+
+       A hedge is only sent once an endpoint has at least ``min_samples``
+       latency measurements, after the request has been outstanding for
+       longer than the ``percentile`` latency of that endpoint, and only
+       while fewer than ``max_rate`` of all requests have been hedged.
+
+       Data members:
+         * requests    -- number of hedgeable requests seen
+         * hedges_sent -- number of hedge requests sent
+         * hedges_won  -- number of hedge requests that finished first
+    """
+
+    def __init__(self, percentile=95, min_samples=20, max_rate=0.05,
+                 window=100, verbs=("GET", "HEAD")):
+        """Create a HedgePolicy
+
+           :param percentile: latency percentile after which to hedge
+           :param min_samples: samples required before hedging an endpoint
+           :param max_rate: maximum fraction of requests that are hedged
+           :param window: number of latency samples kept per endpoint
+           :param verbs: HTTP verbs that are safe to hedge
+        """
+
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_rate = max_rate
+        self.verbs = frozenset(v.upper() for v in verbs)
+
+        self.latency = EndpointStats(lambda: LatencyWindow(window))
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+
+    def start(self, method, url):
+        """Returns the hedge delay for a new request, or None to not hedge"""
+
+        if method.upper() not in self.verbs:
+            return None
+        with self.lock:
+            self.requests += 1
+        lat = self.latency[endpoint(url)]
+        if len(lat) < self.min_samples:
+            return None
+        return lat.percentile(self.percentile)
+
+    def record(self, url, latency):
+        self.latency[endpoint(url)].add(latency)
+
+    def take_hedge(self):
+        """Reserve a hedge if the rate limit allows it"""
+
+        with self.lock:
+            if self.hedges_sent + 1 > self.max_rate * self.requests:
+                return False
+            self.hedges_sent += 1
+            return True
+
+    def won(self):
+        with self.lock:
+            self.hedges_won += 1
+
+    def stats(self):
+        """Summary of hedging activity"""
+
+        with self.lock:
+            return dict(requests=self.requests,
+                        hedges_sent=self.hedges_sent,
+                        hedges_won=self.hedges_won)
+
+
+def _close(fut):
+    if not fut.cancelled() and fut.exception() is None:
+        fut.result().close()
+
+
+class HedgedSession(SessionWrapper):
+    """Session wrapper that hedges idempotent requests
+
+       A requests.Session call cannot be interrupted, so the losing
+       request is not cancelled: it keeps its connection and a worker
+       thread until it completes, and its response is then closed.
+
+       :Example:
+
+       >>> policy = HedgePolicy(percentile=90)
+       >>> session = HedgedSession(requests.Session(), policy)
+       >>> bb = beanbag.v2.BeanBag("http://hostname/api/", session=session)
+       >>> GET(bb.foo)
+       >>> policy.stats()
+       {'requests': 1, 'hedges_sent': 0, 'hedges_won': 0}
+    """
+
+    def __init__(self, session=None, policy=None, max_workers=32):
+        """Create a HedgedSession
+
+           :param session: session to send requests with
+           :param policy: HedgePolicy instance (a default one is created
+                  if not supplied)
+           :param max_workers: size of thread pool used to race requests
+        """
+
+        SessionWrapper.__init__(self, session)
+        if policy is None:
+            policy = HedgePolicy()
+        self.policy = policy
+        self.executor = futures.ThreadPoolExecutor(max_workers)
+
+    def _timed(self, method, url, kwargs):
+        start = time.time()
+        res = self.session.request(method, url, **kwargs)
+        self.policy.record(url, time.time() - start)
+        return res
+
+    def request(self, method, url, **kwargs):
+        delay = self.policy.start(method, url)
+        if delay is None:
+            if method.upper() in self.policy.verbs:
+                return self._timed(method, url, kwargs)
+            return self.session.request(method, url, **kwargs)
+
+        first = self.executor.submit(self._timed, method, url, kwargs)
+        done, _ = futures.wait([first], timeout=delay)
+        if done or not self.policy.take_hedge():
+            return first.result()
+
+        hedge = self.executor.submit(self._timed, method, url, kwargs)
+        pending = set([first, hedge])
+        while True:
+            done, pending = futures.wait(pending,
+                                         return_when=futures.FIRST_COMPLETED)
+            winner = None
+            for fut in done:
+                if fut.exception() is None:
+                    winner = fut
+                    break
+            if winner is not None or not pending:
+                break
+
+        if winner is None:
+            return first.result()   # both failed; raise original error
+
+        for fut in (first, hedge):
+            if fut is not winner:
+                fut.cancel()
+                fut.add_done_callback(_close)
+        if winner is hedge:
+            self.policy.won()
+        return winner.result()
@@ -0,0 +1,200 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""HTTP/2 transport for BeanBag, backed by httpx."""
+
+from requests import exceptions
+
+import threading
+
+__all__ = ['HTTP2Session']
+
+_errors = None
+
+
+def _translate(exc):
+    """The requests exception corresponding to an httpx exception"""
+
+    global _errors
+    if _errors is None:
+        import httpx
+        _errors = [
+            (httpx.ConnectTimeout, exceptions.ConnectTimeout),
+            (httpx.ReadTimeout, exceptions.ReadTimeout),
+            (httpx.TimeoutException, exceptions.Timeout),
+            (httpx.ProxyError, exceptions.ProxyError),
+            (httpx.NetworkError, exceptions.ConnectionError),
+            (httpx.ProtocolError, exceptions.ConnectionError),
+            (httpx.DecodingError, exceptions.ContentDecodingError),
+            (httpx.TooManyRedirects, exceptions.TooManyRedirects),
+            (httpx.UnsupportedProtocol, exceptions.InvalidSchema),
+            (httpx.InvalidURL, exceptions.InvalidURL),
+        ]
+
+    for httpx_cls, cls in _errors:
+        if isinstance(exc, httpx_cls):
+            break
+    else:
+        cls = exceptions.RequestException
+    res = cls(str(exc) or exc.__class__.__name__)
+    res.__cause__ = exc
+    return res
+
+
+def _catching():
+    import httpx
+    return (httpx.HTTPError, httpx.InvalidURL)
+
+
+class HTTP2Response(object):
+    """Wrapper giving an httpx.Response the parts of the
+       requests.Response interface that BeanBag relies on."""
+
+    def __init__(self, response):
+        self._response = response
+
+    def __getattr__(self, attr):
+        return getattr(self._response, attr)
+
+    def _read(self):
+        try:
+            return self._response.read()
+        except _catching() as e:
+            raise _translate(e)
+
+    def _iter(self, it):
+        try:
+            for x in it:
+                yield x
+        except _catching() as e:
+            raise _translate(e)
+
+    @property
+    def content(self):
+        return self._read()
+
+    @property
+    def text(self):
+        self._read()
+        return self._response.text
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        if decode_unicode:
+            return self._iter(self._response.iter_text(chunk_size))
+        return self._iter(self._response.iter_bytes(chunk_size))
+
+    def iter_lines(self, chunk_size=512, decode_unicode=False, delimiter=None):
+        for line in self._iter(self._response.iter_lines()):
+            if not decode_unicode:
+                line = line.encode(self._response.encoding or "utf-8")
+            yield line
+
+    def close(self):
+        self._response.close()
+
+
+class HTTP2Session(object):
+    """Drop-in replacement for requests.Session that speaks HTTP/2.
+
+       All requests made through the session share a single httpx.Client,
+       which multiplexes concurrent requests to the same host over one
+       connection. The client is thread safe, so a BeanBag using this
+       session may be used from many threads at once.
+
+       httpx exceptions are translated to the corresponding
+       ``requests.exceptions`` (eg, ``ConnectionError`` or ``Timeout``),
+       so code that handles errors from a requests.Session works
+       unchanged.
+
+       :Example:
+
+       >>> session = HTTP2Session()
+       >>> bb = beanbag.v2.BeanBag("https://api.example.com/", session=session)
+    """
+
+    def __init__(self, http1=True, max_connections=None, timeout=None,
+                 verify=True, **kwargs):
+        """Create an HTTP/2 session.
+
+           :param http1: also allow falling back to HTTP/1.1 for servers
+                  that do not negotiate HTTP/2
+           :param max_connections: limit on the number of connections kept
+                  open to all hosts
+           :param timeout: default timeout in seconds (None for no timeout)
+           :param verify: TLS verification, as for requests
+           :param kwargs: further arguments passed to httpx.Client
+        """
+
+        import httpx
+
+        self.httpx = httpx
+        self.headers = httpx.Headers()
+        self.auth = None
+
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections)
+        self.client = httpx.Client(http1=http1, http2=True, limits=limits,
+                                   timeout=timeout, verify=verify, **kwargs)
+        self.send_lock = threading.Lock()
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                auth=None, timeout=None, stream=False, **kwargs):
+        """Make a request, accepting requests.Session.request() arguments"""
+
+        hdrs = self.headers.copy()
+        if headers:
+            hdrs.update(headers)
+
+        content = None
+        if isinstance(data, (str, bytes)) or hasattr(data, "__next__"):
+            content, data = data, None
+
+        if auth is None:
+            auth = self.auth
+        if auth is None:
+            auth = self.httpx.USE_CLIENT_DEFAULT
+        if timeout is None:
+            timeout = self.httpx.USE_CLIENT_DEFAULT
+
+        try:
+            req = self.client.build_request(method, url, params=params,
+                    content=content, data=data or None,
+                    headers=hdrs, timeout=timeout, **kwargs)
+            res = self._send(req, auth, stream)
+        except _catching() as e:
+            raise _translate(e)
+        return HTTP2Response(res)
+
+    def _send(self, req, auth, stream):
+        # httpcore picks the next HTTP/2 stream id and sends the request
+        # headers without holding a lock, so threads sharing a connection
+        # can send headers out of stream id order, which the server treats
+        # as a connection error. Hold a lock until the headers are sent.
+        held = [True]
+        chained = req.extensions.get("trace")
+
+        def trace(event, info):
+            if held[0] and event.endswith(".send_request_headers.complete"):
+                held[0] = False
+                self.send_lock.release()
+            if chained is not None:
+                chained(event, info)
+
+        req.extensions["trace"] = trace
+        self.send_lock.acquire()
+        try:
+            return self.client.send(req, auth=auth, stream=stream)
+        finally:
+            if held[0]:
+                held[0] = False
+                self.send_lock.release()
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,144 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Adaptive limit on the number of requests in flight."""
+
+from .session import SessionWrapper
+
+import threading
+import time
+
+__all__ = ['AdaptiveLimiter', 'LimitedSession']
+
+
+class AdaptiveLimiter(object):
+    """Additive-increase/multiplicative-decrease concurrency limit.
+
+       Each successful request whose latency stays within ``tolerance``
+       times the baseline latency grows the limit by about one per
+       limit's worth of requests. A latency spike, an exception, or an
+       overload response (429 or 503) multiplies the limit by
+       ``decrease``, at most once per baseline latency interval so that
+       a burst of concurrent failures only counts once.
+
+       Latencies counted as congestion still move the baseline, though
+       more slowly, so that after a lasting change in the backend's
+       latency the limiter settles on the new level rather than treating
+       every request as congested.
+
+       Data members:
+         * limit    -- current concurrency limit
+         * inflight -- number of requests currently in flight
+         * queued   -- number of requests waiting for a slot
+         * baseline -- smoothed latency of recent requests
+    """
+
+    overload_codes = frozenset([429, 503])
+
+    def __init__(self, initial=10, min_limit=1, max_limit=1000,
+                 decrease=0.5, tolerance=2.0, smoothing=0.05, drift=0.01):
+        """Create an AdaptiveLimiter
+
+           :param initial: initial concurrency limit
+           :param min_limit: limit is never reduced below this
+           :param max_limit: limit is never increased above this
+           :param decrease: factor applied to the limit on congestion
+           :param tolerance: latencies above tolerance * baseline are
+                  treated as congestion
+           :param smoothing: weight of new samples in the baseline latency
+           :param drift: weight of samples treated as congestion in the
+                  baseline latency
+        """
+
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.drift = drift
+
+        self.inflight = 0
+        self.queued = 0
+        self.baseline = None
+        self.last_decrease = 0
+        self.cond = threading.Condition()
+        self.time = time.time
+
+    def acquire(self):
+        """Wait for a free slot"""
+
+        with self.cond:
+            self.queued += 1
+            try:
+                while self.inflight >= int(self.limit):
+                    self.cond.wait()
+            finally:
+                self.queued -= 1
+            self.inflight += 1
+
+    def release(self, latency, ok=True):
+        """Free a slot and adjust the limit
+
+           :param latency: how long the request took, in seconds
+           :param ok: false if the request failed or indicated overload
+        """
+
+        with self.cond:
+            self.inflight -= 1
+            now = self.time()
+            congested = not ok
+            if self.baseline is None:
+                self.baseline = latency
+            elif latency > self.tolerance * self.baseline:
+                congested = True
+                self.baseline += self.drift * (latency - self.baseline)
+            else:
+                self.baseline += self.smoothing * (latency - self.baseline)
+
+            if congested:
+                if now - self.last_decrease >= self.baseline:
+                    self.limit = max(self.min_limit,
+                                     self.limit * self.decrease)
+                    self.last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.cond.notify_all()
+
+    def metrics(self):
+        """Current limit, requests in flight and queue depth"""
+
+        with self.cond:
+            return dict(limit=int(self.limit), inflight=self.inflight,
+                        queued=self.queued, baseline=self.baseline)
+
+
+class LimitedSession(SessionWrapper):
+    """Session wrapper that queues requests over an adaptive limit
+
+       :Example:
+
+       >>> limiter = AdaptiveLimiter(initial=20)
+       >>> session = LimitedSession(requests.Session(), limiter)
+       >>> bb = beanbag.v2.BeanBag("http://hostname/api/", session=session)
+       >>> limiter.metrics()
+       {'limit': 20, 'inflight': 0, 'queued': 0, 'baseline': None}
+    """
+
+    def __init__(self, session=None, limiter=None):
+        SessionWrapper.__init__(self, session)
+        if limiter is None:
+            limiter = AdaptiveLimiter()
+        self.limiter = limiter
+
+    def request(self, method, url, **kwargs):
+        self.limiter.acquire()
+        start = time.time()
+        ok = False
+        try:
+            res = self.session.request(method, url, **kwargs)
+            ok = res.status_code not in self.limiter.overload_codes
+            return res
+        finally:
+            self.limiter.release(time.time() - start, ok)
@@ -0,0 +1,175 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Batch per-ID lookups into multi-get requests."""
+
+from .attrdict import AttrDict
+from .v2 import GET
+
+from concurrent import futures
+import threading
+
+__all__ = ['BatchLoader']
+
+
+class BatchLoader(object):
+    """Collects individual lookups and fetches them in batches.
+
+       Lookups made within ``window`` seconds of each other are combined
+       into a single request of the form ``GET collection?ids=1,2,3``, and
+       the results are split back out to each caller. By default the
+       response must be a list of objects, matched to lookups by their
+       ``key`` field; pass ``results`` to handle other shapes.
+
+       Batches are sent from a background thread, so ``load()`` never
+       waits for a request, even when it fills a batch.
+
+       :Example:
+
+       >>> loader = BatchLoader(myapi.items)
+       >>> f1, f2 = loader.load(1), loader.load(2)   # one request
+       >>> f1.result().name
+       >>> loader.get(3)                             # blocks for result
+    """
+
+    def __init__(self, collection, param="ids", key="id", sep=",",
+                 max_batch=100, window=0.005, dedupe=True, results=None):
+        """Create a BatchLoader
+
+           :param collection: v2 BeanBag URL of the multi-get resource
+           :param param: URL parameter the list of IDs is passed in
+           :param key: field of each result holding its ID
+           :param sep: separator used to join IDs
+           :param max_batch: maximum number of IDs in one request
+           :param window: seconds to wait for further lookups
+           :param dedupe: only request each ID once per batch
+           :param results: function taking a decoded response (as plain
+                  lists and dicts) and returning an iterable of (ID,
+                  object) pairs; eg ``lambda res: res.items()`` for a
+                  response mapping IDs to objects, or ``lambda res:
+                  ((r["id"], r) for r in res["items"])`` for a list
+                  wrapped in an object
+        """
+
+        self.collection = collection
+        self.param = param
+        self.key = key
+        self.sep = sep
+        self.max_batch = max_batch
+        self.window = window
+        self.dedupe = dedupe
+        self.results = results
+
+        self.lock = threading.Lock()
+        self.pending = []
+        self.keys = set()
+        self.timer = None
+
+    def load(self, id):
+        """Queue a lookup, returning a Future for its result"""
+
+        fut = futures.Future()
+        with self.lock:
+            self.pending.append((id, fut))
+            self.keys.add(str(id))
+            if self.dedupe:
+                full = len(self.keys) >= self.max_batch
+            else:
+                full = len(self.pending) >= self.max_batch
+            if full:
+                pending = self._take()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            t = threading.Thread(target=self._send, args=(pending,))
+            t.daemon = True
+            t.start()
+        return fut
+
+    def load_many(self, ids):
+        """Queue several lookups, returning a list of Futures"""
+
+        return [self.load(id) for id in ids]
+
+    def get(self, id):
+        """Look up a single ID, waiting for the result"""
+
+        return self.load(id).result()
+
+    def get_many(self, ids):
+        """Look up several IDs, waiting for the results"""
+
+        return [f.result() for f in self.load_many(ids)]
+
+    def _take(self):
+        """Remove and return the pending lookups (with the lock held)"""
+
+        pending, self.pending = self.pending, []
+        self.keys = set()
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return pending
+
+    def flush(self):
+        """Send all pending lookups now, in this thread"""
+
+        with self.lock:
+            pending = self._take()
+        self._send(pending)
+
+    def _send(self, pending):
+        batch, keys, n = [], set(), 0
+        for id, fut in pending:
+            k = str(id)
+            if k not in keys or not self.dedupe:
+                if n >= self.max_batch:
+                    self.dispatch(batch)
+                    batch, keys, n = [], set(), 0
+                keys.add(k)
+                n += 1
+            batch.append((id, fut))
+        if batch:
+            self.dispatch(batch)
+
+    def dispatch(self, batch):
+        """Make one multi-get request and resolve its futures"""
+
+        waiting = {}
+        ids = []
+        for id, fut in batch:
+            k = str(id)
+            if k not in waiting or not self.dedupe:
+                ids.append(k)
+            waiting.setdefault(k, []).append(fut)
+
+        try:
+            res = GET(self.collection(**{self.param: self.sep.join(ids)}))
+            wrap = isinstance(res, AttrDict)
+            if wrap:
+                res = +res
+            if self.results is not None:
+                found = dict((str(k), v) for k, v in self.results(res))
+            elif isinstance(res, dict):
+                raise TypeError("Expected a list of results, got an object "
+                                "(see BatchLoader's results argument)")
+            else:
+                found = dict((str(item[self.key]), item) for item in res or ())
+        except Exception as e:
+            for fut in (f for fs in waiting.values() for f in fs):
+                fut.set_exception(e)
+            return
+
+        for k, fs in waiting.items():
+            if k not in found:
+                for fut in fs:
+                    fut.set_exception(KeyError(k))
+                continue
+            obj = found[k]
+            if wrap and isinstance(obj, (dict, list)):
+                obj = AttrDict(obj)
+            for fut in fs:
+                fut.set_result(obj)
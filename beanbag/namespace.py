@@ -94,8 +94,9 @@ class NamespaceMeta(type):
            " getitem setitem delitem len iter reversed contains"   # container
            " enter exit"          # context
            " pos neg invert"      # unary
-           " eq ne lt le gt ge"   # comparsion
-           # "cmp rcmp hash unicode", # maybe should do these too?
+           " eq ne lt le gt ge hash"   # comparsion
+           " reduce_ex"           # pickling
+           # "cmp rcmp unicode", # maybe should do these too?
           ).split() + __ops_num + ["r" + _x for _x in __ops_num]
 
     def __new__(mcls, name, bases, nmspc):
@@ -158,6 +159,11 @@ class NamespaceMeta(type):
 
         basefn = getattr(cls, basefnname)
 
+        if basefn is None:
+            # explicitly disabled, eg "hash = None" for mutable objects
+            nsdict["__%s__" % (basefnname,)] = None
+            return
+
         if inum:
             fn = mcls.wrap_path_fn_inum(basefn)
         elif attr:
@@ -257,6 +263,10 @@ class HierarchialNS(Namespace):
         """self != other"""
         return not self.eq(path, other)
 
+    def hash(self, path):
+        """hash(self), consistent with eq()"""
+        return hash((id(self), path))
+
     def get(self, path):
         return self.namespace(path)
 
@@ -0,0 +1,181 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Connection pool sizing, pre-warming and statistics.
+
+These are functions taking a BeanBag rather than BeanBag methods, since
+any attribute of a BeanBag names a sub-resource (``api.warmup`` is the
+URL ``.../warmup``); ``beanbag.remote``, ``beanbag.watch`` and
+``beanbag.snapshot`` work the same way.
+"""
+
+from .session import SessionWrapper
+
+import threading
+import time
+
+try:
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlsplit
+
+__all__ = ['configure', 'warmup', 'pool_stats']
+
+
+class _BrokenBarrier(RuntimeError):
+    pass
+
+
+class _Barrier(object):
+    """Single-use stand-in for threading.Barrier, which Python 2 lacks"""
+
+    def __init__(self, parties, timeout=None):
+        self.parties = parties
+        self.timeout = timeout
+        self.waiting = 0
+        self.broken = False
+        self.cond = threading.Condition()
+
+    def wait(self):
+        with self.cond:
+            self.waiting += 1
+            if self.waiting >= self.parties:
+                self.cond.notify_all()
+            deadline = None
+            if self.timeout is not None:
+                deadline = time.time() + self.timeout
+            while self.waiting < self.parties and not self.broken:
+                if deadline is None:
+                    self.cond.wait()
+                    continue
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.broken = True
+                    self.cond.notify_all()
+                    break
+                self.cond.wait(remaining)
+            if self.broken:
+                raise _BrokenBarrier()
+
+    def abort(self):
+        with self.cond:
+            self.broken = True
+            self.cond.notify_all()
+
+
+Barrier = getattr(threading, "Barrier", _Barrier)
+BrokenBarrierError = getattr(threading, "BrokenBarrierError", _BrokenBarrier)
+
+
+def _base(bb):
+    """Allow functions to be passed a BeanBag or its base object"""
+
+    return getattr(bb, ".base", bb)
+
+
+def _unwrap(session):
+    while isinstance(session, SessionWrapper):
+        session = session.session
+    return session
+
+
+def _urls(base):
+    return getattr(base.session, "base_urls", [base.base_url])
+
+
+def _prefix(url):
+    parts = urlsplit(url)
+    return "%s://%s/" % (parts.scheme, parts.netloc)
+
+
+def configure(session, urls, pool_size=10, pool_block=False):
+    """Mount an HTTPAdapter with the given pool settings for some URLs
+
+       :param session: requests.Session (or wrapper around one)
+       :param urls: URLs whose hosts should use the adapter
+       :param pool_size: maximum number of connections kept per host
+       :param pool_block: if true, requests wait for a free connection
+              rather than opening (and then discarding) extra ones
+    """
+
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=max(10, len(urls)),
+                          pool_maxsize=pool_size, pool_block=pool_block)
+    for url in urls:
+        session.mount(_prefix(url), adapter)
+    return adapter
+
+
+def warmup(bb, n=1, timeout=10.0):
+    """Open n connections to each of a BeanBag's base URLs ahead of use
+
+       This makes n simultaneous HEAD requests to the base URL, so that
+       DNS lookups, TCP and TLS handshakes are complete and the
+       connections are sitting idle in the session's pool when real
+       requests are made. Returns the number of connections opened.
+
+       :param bb: v1 or v2 BeanBag
+       :param n: connections to open per base URL
+       :param timeout: seconds to wait for the connections to be made
+    """
+
+    base = _base(bb)
+    session = _unwrap(base.session)
+
+    def connect(url, barrier, opened):
+        try:
+            r = session.request("HEAD", url, stream=True, timeout=timeout)
+        except Exception:
+            barrier.abort()
+            return
+        try:
+            barrier.wait()
+        except BrokenBarrierError:
+            pass
+        opened.append(url)
+        r.content   # returns the connection to the pool
+
+    opened = []
+    for url in _urls(base):
+        barrier = Barrier(n, timeout=timeout)
+        threads = [threading.Thread(target=connect,
+                                    args=(url, barrier, opened))
+                   for i in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    return len(opened)
+
+
+def pool_stats(bb):
+    """Connection pool utilisation for a BeanBag's session
+
+       Returns a list with one dict per connection pool (ie, per host),
+       giving the pool's ``maxsize``, the connections currently ``idle``
+       in the pool and ``in_use``, and the total ``connections`` opened
+       and ``requests`` made through it.
+    """
+
+    base = _base(bb)
+    res = []
+    seen = set()
+    for adapter in _unwrap(base.session).adapters.values():
+        pm = getattr(adapter, "poolmanager", None)
+        if pm is None or id(pm) in seen:
+            continue
+        seen.add(id(pm))
+        for key in list(pm.pools.keys()):
+            pool = pm.pools.get(key)
+            if pool is None:
+                continue
+            q = pool.pool
+            res.append(dict(scheme=pool.scheme, host=pool.host,
+                            port=pool.port, maxsize=q.maxsize,
+                            idle=sum(1 for c in list(q.queue) if c is not None),
+                            in_use=q.maxsize - q.qsize(),
+                            connections=pool.num_connections,
+                            requests=pool.num_requests))
+    return res
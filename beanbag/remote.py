@@ -0,0 +1,147 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""AttrDicts bound to a remote resource, synced via JSON-Patch."""
+
+from .attrdict import AttrDict
+from .v2 import Request
+
+import copy
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+__all__ = ['RemoteAttrDict', 'fetch', 'commit', 'changes']
+
+
+def _pointer(path):
+    """RFC 6901 JSON pointer for a path"""
+
+    return "".join("/" + str(p).replace("~", "~0").replace("/", "~1")
+                   for p in path)
+
+
+def _rebuild(cls, base, url, etag, ops):
+    """Recreate a RemoteAttrDict (for unpickling)"""
+
+    obj = cls(base, url, etag)
+    getattr(obj, ".base").ops = ops
+    return obj
+
+
+class RemoteAttrDict(AttrDict):
+    """An AttrDict that records the changes made to it.
+
+       Changes made via attribute or item assignment and deletion are
+       recorded as RFC 6902 JSON-Patch operations, so that they can be
+       sent back to the resource the data was fetched from by
+       ``commit()``, rather than uploading the whole document.
+    """
+
+    def __init__(self, base=None, url=None, etag=None):
+        """Create a RemoteAttrDict
+
+           :param base: dictionary/list to be viewed
+           :param url: v2 BeanBag URL of the resource
+           :param etag: ETag of the resource when base was fetched
+        """
+
+        (~AttrDict).__init__(self, base)
+        self.url = url
+        self.etag = etag
+        self.ops = []
+
+    def set(self, path, val):
+        created = len(path)
+        for i in range(1, len(path)):
+            if self.descend(path[:i], create=False) is self._notpresent:
+                created = i
+                break
+        existed = (created == len(path) and
+                   self.descend(path, create=False) is not self._notpresent)
+
+        (~AttrDict).set(self, path, val)
+
+        if isinstance(val, AttrDict):
+            val = +val
+        if existed:
+            self.ops.append(dict(op="replace", path=_pointer(path),
+                                 value=copy.deepcopy(val)))
+        else:
+            top = path[:created]
+            self.ops.append(dict(op="add", path=_pointer(top),
+                                 value=copy.deepcopy(self.pos(top))))
+
+    def delete(self, path):
+        (~AttrDict).delete(self, path)
+        self.ops.append(dict(op="remove", path=_pointer(path)))
+
+    def reduce_ex(self, path, protocol):
+        if path:
+            return (~AttrDict).reduce_ex(self, path, protocol)
+        return (_rebuild, (self.Namespace, self.base, self.url, self.etag,
+                           self.ops))
+
+    def commit(self):
+        """Send recorded changes to the resource
+
+           The changes are sent as a JSON-Patch document via PATCH, with
+           If-Match set to the resource's ETag. If the server does not
+           support PATCH (or JSON-Patch), the whole document is sent via
+           PUT instead.
+        """
+
+        if not self.ops:
+            return
+
+        base, path = ~self.url
+        headers = {"Accept": base.mime_json}
+        if self.etag is not None:
+            headers["If-Match"] = self.etag
+
+        req = Request(data=json.dumps(self.ops), headers=dict(headers,
+                      **{"Content-Type": "application/json-patch+json"}))
+        res = base.make_request(path, "PATCH", req)
+
+        if res.status_code in (405, 415, 501):
+            req = Request(data=json.dumps(self.base), headers=dict(headers,
+                          **{"Content-Type": base.mime_json}))
+            res = base.make_request(path, "PUT", req)
+
+        base.decode(res)   # raises an exception on failure
+        self.etag = res.headers.get("etag")
+        self.ops = []
+
+
+def fetch(url):
+    """GET a v2 BeanBag URL, returning a RemoteAttrDict
+
+       :Example:
+
+       >>> doc = fetch(myapi.documents[12])
+       >>> doc.title = "New title"
+       >>> del doc.draft
+       >>> commit(doc)      # PATCH with just those two changes
+    """
+
+    base, path = ~url
+    res = base.make_request(path, "GET", base.encode(None))
+    obj = base.decode(res)
+    if isinstance(obj, AttrDict):
+        obj = +obj
+    return RemoteAttrDict(obj, url=url, etag=res.headers.get("etag"))
+
+
+def changes(obj):
+    """List of JSON-Patch operations recorded for a RemoteAttrDict"""
+
+    return list(getattr(obj, ".base").ops)
+
+
+def commit(obj):
+    """Send the changes recorded for a RemoteAttrDict to its resource"""
+
+    getattr(obj, ".base").commit()
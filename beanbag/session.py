@@ -0,0 +1,83 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Building blocks for sessions layered on top of requests.Session."""
+
+import threading
+
+__all__ = ['SessionWrapper', 'ThreadLocalSession']
+
+
+class SessionWrapper(object):
+    """Base class for objects that wrap a requests.Session
+
+       BeanBag only ever calls ``session.request()`` (and, for v1,
+       updates ``session.headers``), so a wrapper just needs to override
+       ``request`` to add behaviour. Everything else is passed through to
+       the wrapped session, so wrappers can be stacked.
+    """
+
+    def __init__(self, session=None):
+        if session is None:
+            import requests
+            session = requests.Session()
+        self.session = session
+
+    def __getattr__(self, attr):
+        if attr == "session":
+            raise AttributeError(attr)
+        return getattr(self.session, attr)
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+
+class ThreadLocalSession(SessionWrapper):
+    """Give each thread its own requests.Session
+
+       ``requests.Session`` is not guaranteed to be thread-safe, but
+       creating a separate session (and BeanBag) per thread loses
+       connection reuse between them. A ThreadLocalSession instead
+       creates a session per thread on demand, sharing the wrapped
+       session's configuration with it: headers, auth, cookies, proxies,
+       params, hooks and TLS settings, and its transport adapters, so all
+       threads draw on the same (thread-safe) connection pools.
+
+       Headers, cookies, adapters and other mutable settings are shared
+       by reference, so changes made via the wrapper (eg
+       ``wrapper.headers["X-Foo"] = "bar"`` or ``wrapper.mount(...)``)
+       apply to every thread. Plain values such as ``verify`` are copied
+       when a thread's session is created.
+
+       Use ``BeanBag(..., threadsafe=True)`` to have a BeanBag wrap its
+       session automatically.
+    """
+
+    shared = ("headers", "auth", "cookies", "proxies", "params", "hooks",
+              "verify", "cert", "stream", "trust_env", "max_redirects",
+              "adapters")
+
+    def __init__(self, session=None):
+        SessionWrapper.__init__(self, session)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.created = 0
+
+    def thread_session(self):
+        """The session used by the current thread"""
+
+        s = getattr(self.local, "session", None)
+        if s is None:
+            import requests
+            s = requests.Session()
+            for attr in self.shared:
+                setattr(s, attr, getattr(self.session, attr))
+            self.local.session = s
+            with self.lock:
+                self.created += 1
+        return s
+
+    def request(self, method, url, **kwargs):
+        return self.thread_session().request(method, url, **kwargs)
+
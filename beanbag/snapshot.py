@@ -0,0 +1,175 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Memoise GET requests for the duration of a block of code."""
+
+import threading
+import types
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+__all__ = ['snapshot', 'Snapshot', 'wrap']
+
+
+if contextvars is not None:
+    _active = contextvars.ContextVar("beanbag_snapshots", default=())
+else:
+    class _ThreadVar(threading.local):
+        """Minimal ContextVar lookalike for Pythons without contextvars"""
+
+        value = ()
+
+        def get(self):
+            return self.value
+
+        def set(self, value):
+            old, self.value = self.value, value
+            return old
+
+        def reset(self, token):
+            self.value = token
+
+    _active = _ThreadVar()
+
+
+def active(base):
+    """The innermost snapshot active for a BeanBag base object, or None"""
+
+    for snap in reversed(_active.get()):
+        if snap.base is base:
+            return snap
+    return None
+
+
+def _related(a, b):
+    """Whether one URL is the same as, or beneath, the other
+
+       v2 paths are relative to the base URL, so the root is "" and is
+       above everything.
+    """
+
+    a, b = a.strip("/"), b.strip("/")
+    if not a or not b:
+        return True
+    a, b = a + "/", b + "/"
+    return a.startswith(b) or b.startswith(a)
+
+
+class Snapshot(object):
+    """Cache of GET results for a BeanBag, active within a with block
+
+       Data members:
+         * hits   -- number of requests answered from the cache
+         * misses -- number of requests actually made
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.tokens = []
+        self.generation = 0   # bumped on each invalidation
+
+    def __enter__(self):
+        self.tokens.append(_active.set(_active.get() + (self,)))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active.reset(self.tokens.pop())
+        if not self.tokens:
+            with self.lock:
+                self.cache.clear()
+        return False
+
+    def get(self, key, url, fetch):
+        """Return the cached result for key, or call fetch() to get it
+
+           :param key: hashable key for the request (eg, its path)
+           :param url: URL of the resource, for invalidation
+           :param fetch: function making the request and returning the
+                  decoded result
+        """
+
+        try:
+            with self.lock:
+                if key in self.cache:
+                    self.hits += 1
+                    return self.cache[key][1]
+        except TypeError:   # unhashable parameters
+            return fetch()
+
+        generation = self.generation
+        res = fetch()
+        if isinstance(res, types.GeneratorType):
+            return res   # streamed results can only be consumed once
+        with self.lock:
+            self.misses += 1
+            if generation == self.generation:   # else may be stale
+                self.cache[key] = (url, res)
+        return res
+
+    def invalidate(self, url):
+        """Drop cached results for url, and URLs above or beneath it"""
+
+        with self.lock:
+            self.generation += 1
+            for key, (u, res) in list(self.cache.items()):
+                if _related(u, url):
+                    del self.cache[key]
+
+
+def snapshot(bb):
+    """Memoise GET requests made via a BeanBag within a with block
+
+       :Example:
+
+       >>> with snapshot(myapi):
+       ...     user = GET(myapi.users[12])
+       ...     same = GET(myapi.users[12])    # no request made
+       ...     PUT(myapi.users[12], changes)  # drops users/12 from cache
+       ...     GET(myapi.users[12])           # makes a new request
+
+       Results are keyed on the resource's path and URL parameters.
+       Requests using any method other than GET, HEAD or OPTIONS drop
+       cached results for the same resource, and for resources above and
+       beneath it (eg, a POST to ``users`` drops ``users/12`` and
+       ``users?page=2``). Cached results are shared, not copied, so
+       should not be modified.
+
+       The snapshot applies to the current thread (or asyncio task),
+       and to functions run via ``wrap()``, including the requests made
+       by a ``beanbag.graph.Graph``.
+
+       :param bb: v1 or v2 BeanBag
+    """
+
+    return Snapshot(getattr(bb, ".base", bb))
+
+
+def wrap(fn):
+    """Make fn run with the current snapshots active, eg in another thread
+
+       :Example:
+
+       >>> with snapshot(myapi):
+       ...     t = threading.Thread(target=wrap(worker))
+       ...     t.start()
+    """
+
+    snaps = _active.get()
+    if not snaps:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _active.set(snaps)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _active.reset(token)
+    return run
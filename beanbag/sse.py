@@ -0,0 +1,82 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Incremental parser for Server-Sent Events (text/event-stream)."""
+
+__all__ = ['Event', 'parse']
+
+mime = "text/event-stream"
+
+
+class Event(object):
+    """A single server-sent event
+
+       Data members:
+         * event -- event type ("message" unless specified by the server)
+         * data  -- event payload (decoded from JSON by ``STREAM`` where
+                    possible)
+         * id    -- event id, or None
+         * retry -- reconnection delay requested by the server in
+                    milliseconds, or None
+    """
+
+    __slots__ = ('event', 'data', 'id', 'retry')
+
+    def __init__(self, data, event="message", id=None, retry=None):
+        self.event = event
+        self.data = data
+        self.id = id
+        self.retry = retry
+
+    def __repr__(self):
+        return "%s(%r, event=%r, id=%r)" % (self.__class__.__name__,
+                self.data, self.event, self.id)
+
+
+def parse(lines, last_id=None):
+    """Generator yielding Events from an iterable of lines
+
+       A block that only sets the reconnection delay is yielded as an
+       Event whose ``data`` and ``event`` are None.
+
+       :param lines: lines of the event stream, as str or utf-8 bytes,
+              without line terminators
+       :param last_id: id of the last event received on a previous
+              connection, used until the stream sets a new one
+    """
+
+    data = []
+    event = None
+    id = last_id
+    retry = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+
+        if not line:
+            if data:
+                yield Event("\n".join(data), event or "message", id, retry)
+            elif retry is not None:
+                yield Event(None, None, id, retry)
+            data = []
+            event = retry = None
+            continue
+
+        if line.startswith(":"):
+            continue
+
+        field, sep, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+
+        if field == "data":
+            data.append(value)
+        elif field == "event":
+            event = value
+        elif field == "id":
+            if "\0" not in value:
+                id = value
+        elif field == "retry":
+            if value.isdigit():
+                retry = int(value)
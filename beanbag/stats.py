@@ -0,0 +1,76 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Helpers for keeping track of request statistics per endpoint."""
+
+import collections
+import re
+import threading
+
+try:
+    from urlparse import urlsplit
+except ImportError:
+    from urllib.parse import urlsplit
+
+
+_id_re = re.compile(r"^(\d+|[0-9a-fA-F]{8,}|"
+                    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-"
+                    r"[0-9a-fA-F]{4}-[0-9a-fA-F]{12})$")
+
+
+def endpoint(url):
+    """Templated form of a URL, for grouping requests by endpoint
+
+       The query string is dropped, and path components that look like
+       identifiers (integers, hex strings and UUIDs) are replaced by
+       ``{id}``, so that ``http://host/api/users/12/repos?page=3`` becomes
+       ``http://host/api/users/{id}/repos``.
+    """
+
+    parts = urlsplit(url)
+    path = "/".join("{id}" if _id_re.match(p) else p
+                    for p in parts.path.split("/"))
+    return "%s://%s%s" % (parts.scheme, parts.netloc, path)
+
+
+class LatencyWindow(object):
+    """Sliding window of recent latency samples"""
+
+    def __init__(self, size=100):
+        self.samples = collections.deque(maxlen=size)
+
+    def add(self, latency):
+        self.samples.append(latency)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def percentile(self, pct):
+        """Latency at the given percentile (0-100), or None if no samples"""
+
+        if not self.samples:
+            return None
+        s = sorted(self.samples)
+        idx = int(round((len(s) - 1) * pct / 100.0))
+        return s[idx]
+
+
+class EndpointStats(object):
+    """Thread safe map from endpoint to a per-endpoint statistics object"""
+
+    def __init__(self, factory=LatencyWindow):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.stats = {}
+
+    def __getitem__(self, key):
+        with self.lock:
+            s = self.stats.get(key)
+            if s is None:
+                s = self.stats[key] = self.factory()
+            return s
+
+    def items(self):
+        with self.lock:
+            return list(self.stats.items())
@@ -0,0 +1,253 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Hierarchical tracing spans for BeanBag requests."""
+
+from .stats import endpoint
+
+import collections
+import os
+import random
+import threading
+import time
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+__all__ = ['Tracer', 'Span']
+
+
+class Span(object):
+    """A timed operation, possibly nested within another
+
+       Data members:
+         * name     -- what was being done, eg "encode" or "send"
+         * start    -- start time (seconds since the epoch)
+         * end      -- end time, or None while the span is open
+         * attrs    -- dict of attributes (method, path, status...)
+         * trace_id -- 32 hex digit id shared by all spans in a trace
+         * span_id  -- 16 hex digit id of this span
+         * parent_id -- span_id of the enclosing span, or None
+         * thread   -- id of the thread the span ran in
+    """
+
+    __slots__ = ('tracer', 'name', 'start', 'end', 'attrs', 'trace_id',
+                 'span_id', 'parent_id', 'thread')
+
+    def __init__(self, tracer, name, attrs, trace_id, parent_id, start=None):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.trace_id = trace_id
+        self.span_id = "%016x" % (random.getrandbits(64),)
+        self.parent_id = parent_id
+        self.thread = threading.current_thread().ident
+        self.start = time.time() if start is None else start
+        self.end = None
+
+    def set(self, **attrs):
+        """Add attributes to the span"""
+
+        self.attrs.update(attrs)
+
+    def traceparent(self):
+        """W3C Trace Context ``traceparent`` header value for this span"""
+
+        return "00-%s-%s-01" % (self.trace_id, self.span_id)
+
+    def __enter__(self):
+        self.tracer._push(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._pop(self)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.finish(self)
+        return False
+
+    def __repr__(self):
+        return "<Span(%s %r)>" % (self.name, self.attrs)
+
+
+class _NoSpan(object):
+    """Stand-in for Span when tracing is disabled"""
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+nospan = _NoSpan()
+
+
+class Tracer(object):
+    """Collects spans for requests made via BeanBags
+
+       :Example:
+
+       >>> tracer = Tracer()
+       >>> api = BeanBag("https://api.example.org/", tracer=tracer)
+       >>> GET(api.users[12])
+       >>> tracer.write_chrome("beanbag-trace.json")
+
+       Each request made by a BeanBag with a tracer is recorded as a
+       "request" span (with method, templated path and status
+       attributes), containing "encode", "send" and "decode" spans; the
+       "send" span in turn contains a "wait" span covering the time until
+       the response headers arrived. Spans opened by the application with
+       ``tracer.span()`` enclose any requests made within them in the same
+       thread.
+
+       Outgoing requests carry a W3C ``traceparent`` header identifying
+       the "send" span, so that server side logs can be matched up with
+       the client's trace.
+    """
+
+    def __init__(self, max_spans=100000, propagate=True):
+        """Create a Tracer
+
+           :param max_spans: number of finished spans to keep; older
+                  spans are discarded
+           :param propagate: add ``traceparent`` headers to requests
+        """
+
+        self.spans = collections.deque(maxlen=max_spans)
+        self.propagate = propagate
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def _stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def _push(self, span):
+        self._stack().append(span)
+
+    def _pop(self, span):
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+
+    def current(self):
+        """The innermost open span in this thread, or None"""
+
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def span(self, name, traceparent=None, **attrs):
+        """Create a span, to be used as a context manager
+
+           :param name: name of the span
+           :param traceparent: incoming ``traceparent`` header to continue
+                  a trace from, if there is no enclosing span
+           :param attrs: attributes for the span
+        """
+
+        parent = self.current()
+        if parent is not None:
+            return Span(self, name, attrs, parent.trace_id, parent.span_id)
+
+        if traceparent is not None:
+            parts = traceparent.strip().split("-")
+            if len(parts) >= 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+                return Span(self, name, attrs, parts[1], parts[2])
+
+        return Span(self, name, attrs, "%032x" % (random.getrandbits(128),),
+                    None)
+
+    def finish(self, span, end=None):
+        """Record a span as finished"""
+
+        span.end = time.time() if end is None else end
+        with self.lock:
+            self.spans.append(span)
+
+    def record(self, name, start, end, **attrs):
+        """Record a span that has already happened, within the current span"""
+
+        span = self.span(name, **attrs)
+        span.start = start
+        self.finish(span, end)
+        return span
+
+    def inject(self, headers):
+        """Add a ``traceparent`` header for the current span to headers"""
+
+        span = self.current()
+        if span is not None:
+            headers["traceparent"] = span.traceparent()
+        return headers
+
+    def send(self, session, *args, **kwargs):
+        """Call ``session.request()`` within a "send" span"""
+
+        with self.span("send") as span:
+            if self.propagate:
+                kwargs["headers"] = self.inject(
+                        dict(kwargs.get("headers") or {}))
+            res = session.request(*args, **kwargs)
+            self.sent(span, res)
+        return res
+
+    def request(self, method, url):
+        """Span for a request made via a BeanBag"""
+
+        return self.span("request", method=method, path=endpoint(str(url)))
+
+    def sent(self, send, response):
+        """Record the status of a response and the time spent waiting
+
+           :param send: the span covering ``session.request()``
+           :param response: the response received
+        """
+
+        status = getattr(response, "status_code", None)
+        send.attrs["status"] = status
+        for span in reversed(self._stack()):
+            if span.name == "request":
+                span.attrs["status"] = status
+                break
+
+        elapsed = getattr(response, "elapsed", None)
+        if elapsed is not None and hasattr(elapsed, "total_seconds"):
+            wait = elapsed.total_seconds()
+            self.record("wait", send.start, send.start + wait)
+
+    def chrome(self):
+        """Finished spans as Chrome trace events
+
+           The result can be saved as JSON and loaded into
+           ``chrome://tracing`` or Perfetto.
+        """
+
+        with self.lock:
+            spans = list(self.spans)
+
+        pid = os.getpid()
+        events = []
+        for s in spans:
+            args = dict(s.attrs, trace_id=s.trace_id, span_id=s.span_id)
+            if s.parent_id is not None:
+                args["parent_id"] = s.parent_id
+            events.append(dict(name=s.name, cat="beanbag", ph="X",
+                               ts=s.start * 1e6, dur=(s.end - s.start) * 1e6,
+                               pid=pid, tid=s.thread, args=args))
+        events.sort(key=lambda e: (e["ts"], -e["dur"]))
+        return dict(traceEvents=events, displayTimeUnit="ms")
+
+    def write_chrome(self, filename):
+        """Write finished spans to a file in Chrome trace JSON format"""
+
+        with open(filename, "w") as f:
+            json.dump(self.chrome(), f)
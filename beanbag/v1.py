@@ -6,6 +6,10 @@
 from __future__ import print_function
 
 from .bbexcept import BeanBagException
+from .client import Client
+from . import snapshot
+from . import codec
+from .compress import compress, accept_encoding, decompress_response
 from .auth import KerbAuth, OAuth10aDance
 from .namespace import SettableHierarchialNS
 
@@ -21,41 +25,58 @@ __all__ = ['BeanBag', 'BeanBagException',
            'KerbAuth', 'OAuth10aDance']
 
 
-class BeanBag(SettableHierarchialNS):
+class BeanBag(Client, SettableHierarchialNS):
+    mime_ndjson = "application/x-ndjson"
+
     def __init__(self, base_url, ext="", session=None,
-                 fmt='json'):
+                 fmt='json', compression=None, compress_threshold=1024,
+                 pool_size=None, pool_block=False, threadsafe=False,
+                 tracer=None, capture_errors=False, errors=None):
         """Create a BeanBag referencing a base REST path.
 
-           :param base_url: the base URL prefix for all resources
+           :param base_url: the base URL prefix for all resources, or a
+                  list of equivalent base URLs to balance requests across
            :param ext: extension to add to resource URLs, eg ".json"
            :param session: requests.Session instance used for this API. Useful
                   to set an auth procedure, or change verify parameter.
            :param fmt: either 'json' for json data, or a tuple specifying a
                   content-type string, encode function (for encoding the
                   request body) and a decode function (for decoding responses)
+           :param compression: content encoding ("gzip", "br", "zstd"...)
+                  used to compress request bodies, or None
+           :param compress_threshold: only compress bodies of at least
+                  this many bytes
+
+           The ``pool_size``, ``pool_block``, ``threadsafe``, ``tracer``,
+           ``capture_errors`` and ``errors`` arguments are described in
+           ``beanbag.client.Client.setup()``.
         """
 
-        if session is None:
-            session = requests.Session()
+        self.setup(base_url, session, pool_size, pool_block, threadsafe,
+                   tracer, capture_errors, errors)
 
         if fmt == 'json':
             content_type = "application/json"
             encode = json.dumps
-            decode = lambda req: json.loads(req.text or req.content)
+            decode = codec.JSON.decode
         else:
             content_type, encode, decode = fmt
 
-        self.base_url = base_url.rstrip("/") + "/"
         self.ext = ext
 
         self.content_type = content_type
         self.encode = encode
         self.decode = decode
 
-        self.session = session
+        self.compression = compression
+        self.compress_threshold = compress_threshold
 
-        self.session.headers["accept"] = self.content_type
+        accept = self.content_type
+        if fmt == 'json':
+            accept = "%s, %s;q=0.5" % (accept, self.mime_ndjson)
+        self.session.headers["accept"] = accept
         self.session.headers["content-type"] = self.content_type
+        self.session.headers["accept-encoding"] = accept_encoding()
 
     def str(self, path):
         """Obtain the URL of a resource"""
@@ -138,34 +159,91 @@ class BeanBag(SettableHierarchialNS):
         return None
 
     def make_request(self, path, verb, params, body):
-        path = self.str(path)
-
+        url = self.str(path)
+
+        snap = snapshot.active(self)
+        if snap is not None:
+            if verb == "GET" and body is None:
+                try:
+                    key = (url, frozenset((params or {}).items()))
+                except TypeError:   # unhashable parameters, eg lists
+                    pass
+                else:
+                    return snap.get(key, url, lambda: self._traced_request(
+                            path, url, verb, params, body))
+            elif verb not in ("HEAD", "OPTIONS"):
+                snap.invalidate(url)
+
+        return self._traced_request(path, url, verb, params, body)
+
+    def _traced_request(self, path, url, verb, params, body):
+        with self.trace_request(path, verb):
+            return self._make_request(url, verb, params, body)
+
+    def _make_request(self, path, verb, params, body):
         if body is None:
             ebody = None
         else:
             try:
-                ebody = self.encode(body)
+                with self.span("encode"):
+                    ebody = self.encode(body)
             except:
-                raise BeanBagException(None, "Could not encode request body")
+                raise self.error(None, "Could not encode request body",
+                                 verb, path)
 
-        r = self.session.request(verb, path, params=params, data=ebody)
+        kwargs = {"stream": True}   # NDJSON is decoded as it arrives
+        if (ebody is not None and self.compression is not None and
+                len(ebody) >= self.compress_threshold):
+            ebody = compress(ebody, self.compression)
+            kwargs["headers"] = {"content-encoding": self.compression}
+
+        try:
+            if self.tracer is not None:
+                r = self.tracer.send(self.session, verb, path, params=params,
+                                     data=ebody, **kwargs)
+            else:
+                r = self.session.request(verb, path, params=params,
+                                         data=ebody, **kwargs)
+        except BeanBagException as e:   # eg, from beanbag.breaker
+            raise self.error(e.response, e.msg, verb, path)
 
         if r.status_code < 200 or r.status_code >= 300:
-            raise BeanBagException(r,
-                    "Bad response code: %d" % (r.status_code,))
+            raise self.error(r,
+                    "Bad response code: %d" % (r.status_code,), verb, path)
 
-        if not r.content:
-            return None
+        r = decompress_response(r)
 
         ctype = r.headers.get("content-type", self.content_type)
         ctype = ctype.split(";", 1)[0]
+        if ctype == self.mime_ndjson:
+            return self.decode_ndjson(r)
+
+        if not r.content:
+            return None
+
         if ctype != self.content_type:
-            raise BeanBagException(r,
+            raise self.error(r,
                     "Bad content-type in response (Content-Type: %s)"
-                                     % (r.headers["content-type"],))
+                                     % (r.headers["content-type"],),
+                    verb, path)
 
         try:
-            return self.decode(r)
+            with self.span("decode"):
+                return self.decode(r)
         except:
-            raise BeanBagException(r, "Could not decode response")
+            raise self.error(r, "Could not decode response", verb, path)
+
+    def decode_ndjson(self, r):
+        """Generator yielding each record of an NDJSON response"""
 
+        try:
+            for line in r.iter_lines():
+                if not line.strip():
+                    continue
+                try:
+                    obj = json.loads(line)
+                except:
+                    raise self.error(r, "Could not decode response")
+                yield obj
+        finally:
+            r.close()
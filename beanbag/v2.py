@@ -4,18 +4,30 @@
 # See LICENSE file.
 
 from .namespace import HierarchialNS
+from .client import Client
 from .bbexcept import BeanBagException
+from .compress import compress, accept_encoding, decompress_response
 from .attrdict import AttrDict
+from . import codec
+from . import sse
+from . import snapshot
 
 import requests
+import time
 
 try:
     import json
 except ImportError:
     import simplejson as json
 
+try:
+    from collections.abc import Iterator, Mapping
+except ImportError:
+    from collections import Iterator, Mapping
+
 
-__all__ = ['BeanBag', 'Request', 'verb', 'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE']
+__all__ = ['BeanBag', 'Request', 'NDJSON', 'verb', 'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+           'STREAM']
 __version__ = '2.0.0'
 
 
@@ -27,9 +39,19 @@ def verb(verbname):
 
     def do(url, body=None):
         base, path = ~url
-        req = base.encode(body)
-        res = base.make_request(path, verbname, req)
-        return base.decode(res)
+        if verbname == "GET" and body is None:
+            snap = snapshot.active(base)
+            if snap is not None:
+                return snap.get(path, path[0], lambda: fetch(base, path, body))
+        return fetch(base, path, body)
+
+    def fetch(base, path, body):
+        with base.trace_request(path, verbname):
+            with base.span("encode"):
+                req = base.encode(body)
+            res = base.make_request(path, verbname, req)
+            with base.span("decode"):
+                return _decode(base, res, body)
 
     do.__name__ = verbname
     do.__doc__ = "%s verb function" % (verbname,)
@@ -43,6 +65,66 @@ PATCH = verb("PATCH")
 DELETE = verb("DELETE")
 
 
+def STREAM(url, body=None, reconnect=True, retry=3.0):
+    """Generator yielding items from a streaming response
+
+       For ``text/event-stream`` responses, each server-sent event is
+       yielded as a ``beanbag.sse.Event`` as soon as it is received, with
+       JSON ``data`` payloads decoded (into an ``AttrDict`` where
+       appropriate). If the connection drops, the request is retried
+       after ``retry`` seconds (or the delay the server asked for) with a
+       ``Last-Event-ID`` header, unless ``reconnect`` is false. A 204
+       response ends the stream.
+
+       For ``application/x-ndjson`` responses, each record is yielded as
+       it is received; any other response is decoded and yielded as a
+       single item.
+
+       :param url: BeanBag URL to GET
+       :param body: optional Request object with extra request arguments
+    """
+
+    base, path = ~url
+    last_id = None
+    while True:
+        req = base.encode(body)
+        headers = (+req).setdefault("headers", {})
+        accept = headers.get("Accept", "*/*")
+        if sse.mime not in accept:
+            headers["Accept"] = "%s, %s" % (sse.mime, accept)
+        if last_id is not None:
+            headers["Last-Event-ID"] = last_id
+        req.stream = True
+
+        try:
+            res = base.make_request(path, "GET", req)
+            if res.status_code == 204:
+                return
+            ctype = res.headers.get("content-type", "").split(";", 1)[0].strip()
+            if ctype != sse.mime:
+                obj = _decode(base, res, body)
+                if ctype == base.mime_ndjson:
+                    for o in obj:
+                        yield o
+                else:
+                    yield obj
+                return
+
+            for evt in base.decode_events(res, last_id):
+                if evt.retry is not None:
+                    retry = evt.retry / 1000.0
+                last_id = evt.id
+                if evt.event is not None:
+                    yield evt
+        except requests.exceptions.RequestException:
+            if not reconnect:
+                raise
+
+        if not reconnect:
+            return
+        time.sleep(retry)
+
+
 class Request(AttrDict):
     def __init__(self, **kwargs):
         """Create a Request object
@@ -73,84 +155,348 @@ class Request(AttrDict):
         (~AttrDict).__init__(self, d)
 
 
-class BeanBag(HierarchialNS):
+class NDJSON(object):
+    def __init__(self, items):
+        """Mark an iterable to be sent as newline-delimited JSON
+
+           :Example:
+
+           >>> POST(bb.bulk, NDJSON(record for record in records))
+
+           The items are serialised lazily while the request is being
+           sent, so the iterable may be a generator producing more
+           records than would fit in memory.
+        """
+
+        self.items = items
+
+
+def _codec(body):
+    """The codec a request body was wrapped in, if any"""
+
+    if isinstance(body, codec.Formatted):
+        return body.codec
+    return None
+
+
+def _decode(base, response, body):
+    """Decode a response, accepting the codec the body asked for
+
+       ``fmt`` is only passed when there is one, so subclasses overriding
+       ``decode(self, response)`` keep working.
+    """
+
+    fmt = _codec(body)
+    if fmt is None:
+        return base.decode(response)
+    return base.decode(response, fmt)
+
+
+def _chunked(pieces, size=64 << 10):
+    """Join string pieces into encoded chunks of roughly size bytes"""
+
+    buf, buflen = [], 0
+    for p in pieces:
+        buf.append(p)
+        buflen += len(p)
+        if buflen >= size:
+            yield "".join(buf).encode("utf-8")
+            buf, buflen = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
+
+
+def _json_items(items, sep):
+    for item in items:
+        if isinstance(item, AttrDict):
+            item = +item
+        yield json.dumps(item)
+        yield sep
+
+
+def _json_array(items):
+    yield "["
+    first = True
+    for item in items:
+        if isinstance(item, AttrDict):
+            item = +item
+        if not first:
+            yield ","
+        first = False
+        yield json.dumps(item)
+    yield "]"
+
+
+class Params(Mapping):
+    """Immutable mapping of URL parameters for a resource path
+
+       Each call that adds parameters (``bb.foo(a=1)(b=2)``) creates a
+       Params that just records its changes and refers to its parent's
+       Params, rather than copying the parent's parameters. The combined
+       parameters are worked out (and cached) when first needed, eg when
+       a request is made. Params are hashable, so resources can be used
+       as dictionary keys.
+    """
+
+    __slots__ = ('parent', 'changes', '_flat', '_hash')
+
+    def __init__(self, parent=None, changes=()):
+        """Create a Params object
+
+           :param parent: Params these changes are applied to, or None
+           :param changes: sequence of (key, value) pairs; a value of None
+                  removes the key
+        """
+
+        self.parent = parent
+        self.changes = tuple(changes)
+        self._flat = None
+        self._hash = None
+
+    def flat(self):
+        """The combined parameters, as a dict (do not modify)"""
+
+        if self._flat is None:
+            d = {}
+            if self.parent is not None:
+                d.update(self.parent.flat())
+            for k, v in self.changes:
+                if v is not None:
+                    d[k] = v
+                else:
+                    d.pop(k, None)
+            self._flat = d
+        return self._flat
+
+    def __getitem__(self, key):
+        return self.flat()[key]
+
+    def __iter__(self):
+        return iter(self.flat())
+
+    def __len__(self):
+        return len(self.flat())
+
+    def __hash__(self):
+        if self._hash is None:
+            items = self.flat().items()
+            try:
+                self._hash = hash(frozenset(items))
+            except TypeError:   # unhashable values, eg lists
+                self._hash = hash(frozenset(k for k, v in items))
+        return self._hash
+
+    def __repr__(self):
+        return "Params(%r)" % (self.flat(),)
+
+    def __reduce__(self):
+        return (Params, (None, tuple(self.flat().items())))
+
+    def copy(self):
+        """Mutable copy of the parameters, as a dict"""
+
+        return dict(self.flat())
+
+
+_noparams = Params()
+
+
+def _rebuild(cls, config, state, path):
+    """Recreate a BeanBag resource from its configuration (for unpickling)
+
+       The base object is created without calling ``__init__``, so that
+       subclasses with a different constructor signature unpickle too;
+       ``setup()`` makes a new session, and the rest of the base object's
+       attributes are restored from state.
+    """
+
+    basecls = ~cls
+    base = basecls.__new__(basecls)
+    base.setup(config["base_url"], None, config["pool_size"],
+               config["pool_block"], config["threadsafe"], None,
+               config["capture_errors"], None)
+    base.__dict__.update(state)
+    base.formats = [codec.lookup(f) for f in base.formats]
+    return base.namespace(path)
+
+
+# attributes set by Client.setup(), which _rebuild() calls afresh
+_setup_attrs = ("base_url", "session", "tracer", "capture_errors", "errors")
+
+
+class BeanBag(Client, HierarchialNS):
     mime_json = "application/json"
+    mime_ndjson = "application/x-ndjson"
 
-    def __init__(self, base_url, ext="", session=None, use_attrdict=True):
+    def __init__(self, base_url, ext="", session=None, use_attrdict=True,
+                 compression=None, compress_threshold=1024, formats=None,
+                 pool_size=None, pool_block=False, threadsafe=False,
+                 tracer=None, capture_errors=False, errors=None):
         """Create a BeanBag referencing a base REST path.
 
-           :param base_url: the base URL prefix for all resources
+           :param base_url: the base URL prefix for all resources, or a
+                  list of equivalent base URLs to balance requests across
            :param ext: extension to add to resource URLs, eg ".json"
            :param session: requests.Session instance used for this API. Useful
                   to set an auth procedure, or change verify parameter.
            :param use_attrdict: if true, ``decode()`` will wrap dicts and
                   lists in a ``beanbag.attrdict.AttrDict`` for syntactic
                   sugar.
+           :param compression: content encoding ("gzip", "br", "zstd"...)
+                  used to compress request bodies, or None
+           :param compress_threshold: only compress bodies of at least
+                  this many bytes
+           :param formats: list of content formats (``beanbag.codec``
+                  codecs, or names such as "json", "msgpack" or "cbor")
+                  in order of preference. Request bodies are encoded
+                  using the first. Defaults to JSON only.
+
+           The ``pool_size``, ``pool_block``, ``threadsafe``, ``tracer``,
+           ``capture_errors`` and ``errors`` arguments are described in
+           ``beanbag.client.Client.setup()``.
         """
 
-        if session is None:
-            session = requests.Session()
+        self.config = dict(base_url=base_url, ext=ext,
+                           use_attrdict=use_attrdict, compression=compression,
+                           compress_threshold=compress_threshold,
+                           formats=formats, pool_size=pool_size,
+                           pool_block=pool_block, threadsafe=threadsafe,
+                           capture_errors=capture_errors)
 
-        self.base_url = base_url.rstrip("/") + "/"
+        self.setup(base_url, session, pool_size, pool_block, threadsafe,
+                   tracer, capture_errors, errors)
         self.ext = ext
-
-        self.session = session
         self.use_attrdict = use_attrdict
 
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.accept_encoding = accept_encoding()
+
+        if formats is None:
+            formats = [self.mime_json]
+        self.formats = [codec.lookup(f) for f in formats]
+
+    def accept(self, preferred=None):
+        """Value for the Accept header, listing formats by preference"""
+
+        formats = self.formats
+        if preferred is not None:
+            formats = [preferred] + [f for f in formats if f is not preferred]
+        accept = [formats[0].mime]
+        for i, f in enumerate(formats[1:]):
+            accept.append("%s;q=%.1f" % (f.mime, max(0.1, 0.9 - i / 10.0)))
+        return ", ".join(accept)
+
     def encode(self, body):
         """Convert a python object into a beanbag.Request object.
 
            This function converts the user provided body object (or None
            when there is no body) into a requests.Request object, by
-           encoding it as JSON string. (Note that the url and method
-           members of the Request are provided later by the
+           encoding it in the BeanBag's first format (JSON by default).
+           (Note that the url and method members of the Request are
+           provided later by the ``make_request()`` function.)
+
+           A body wrapped in a codec, eg ``MSGPACK(body)``, is encoded
+           in that format instead, and that format is listed first in
+           the ``Accept`` header.
+
+           Iterators and generators are encoded lazily as a JSON array
+           when the format is JSON, and iterables wrapped in ``NDJSON``
+           as newline-delimited JSON; in both cases the body is sent with
+           chunked transfer encoding so the whole body is never held in
+           memory. In other formats, iterators are encoded as a list.
+
+           If ``compression`` was given when creating the BeanBag, other
+           bodies of at least ``compress_threshold`` bytes are compressed
+           and sent with a ``Content-Encoding`` header.
 
            :param body: provided by the API user, usually a dict or None
         """
 
+        fmt = self.formats[0]
+        if isinstance(body, codec.Formatted):
+            fmt, body = body.codec, body.body
+
+        headers = {"Accept": self.accept(fmt),
+                   "Accept-Encoding": self.accept_encoding}
+
         if isinstance(body, Request):
             req = body
         elif body is None:
-            req = Request(data=None, headers={"Accept": self.mime_json})
+            req = Request(data=None, headers=headers)
+        elif isinstance(body, NDJSON):
+            headers["Content-Type"] = self.mime_ndjson
+            req = Request(data=_chunked(_json_items(body.items, "\n")),
+                    headers=headers)
+        elif isinstance(body, Iterator) and fmt.mime == self.mime_json:
+            headers["Content-Type"] = self.mime_json
+            req = Request(data=_chunked(_json_array(body)), headers=headers)
         else:
             if isinstance(body, AttrDict):
                 body = +body
-            req = Request(data=json.dumps(body),
-                    headers={"Accept": self.mime_json,
-                        "Content-Type": self.mime_json})
+            elif isinstance(body, Iterator):
+                body = [+i if isinstance(i, AttrDict) else i for i in body]
+            data = fmt.encode(body)
+            headers["Content-Type"] = fmt.mime
+            if (self.compression is not None and
+                    len(data) >= self.compress_threshold):
+                data = compress(data, self.compression)
+                headers["Content-Encoding"] = self.compression
+            req = Request(data=data, headers=headers)
         return req
 
-    def decode(self, response):
+    def decode(self, response, fmt=None):
         """Converts a requests.Response object to a python object
 
            This function converts the REST API's response back into a
-           python object by decoding it from JSON (or raises an exception
-           if the response indicates an error).
+           python object by decoding it according to its Content-Type,
+           which must be one of the BeanBag's formats or ``fmt`` (or
+           raises an exception if the response indicates an error).
+
+           Newline-delimited JSON responses are decoded into a generator
+           that yields each record as it is read from the response, via
+           ``iter_lines()``. To process records as they arrive rather
+           than after the whole body has downloaded, make the request
+           with ``Request(stream=True)``.
 
            :param response: requests.Response object
+           :param fmt: codec the request asked for (eg from a body wrapped
+                  in ``CBOR(...)``), preferred over the BeanBag's formats
         """
 
         if response.status_code < 200 or response.status_code >= 300:
-            raise BeanBagException(response,
+            raise self.error(response,
                     "Bad response code: %d" % (response.status_code,))
 
+        response = decompress_response(response)
+
+        res_content = response.headers.get("content-type", None)
+        if res_content is not None:
+            res_content = res_content.split(";", 1)[0].strip()
+        if res_content == self.mime_ndjson:
+            return self.decode_ndjson(response)
+
         if not response.content:
             return None
 
-        res_content = response.headers.get("content-type", None)
+        formats = self.formats
+        if fmt is not None:
+            formats = [fmt] + [f for f in formats if f is not fmt]
         if res_content is None:
-            pass
-        elif res_content.split(";", 1)[0] == self.mime_json:
-            pass
+            fmt = formats[0]
         else:
-            raise BeanBagException(response,
-                    "Bad content-type in response (Content-Type: %s; wanted %s)"
-                                     % (res_content.split(";", 1)[0],
-                                         self.mime_json))
+            for fmt in formats:
+                if res_content in fmt.mimes:
+                    break
+            else:
+                raise self.error(response,
+                        "Bad content-type in response (Content-Type: %s; wanted %s)"
+                                         % (res_content,
+                                             ", ".join(f.mime for f in formats)))
         try:
-            obj = json.loads(response.text or response.content)
+            obj = fmt.decode(response)
         except:
-            raise BeanBagException(response, "Could not decode response")
+            raise self.error(response, "Could not decode response")
 
         if self.use_attrdict:
             if isinstance(obj, dict) or isinstance(obj, list):
@@ -158,6 +504,51 @@ class BeanBag(HierarchialNS):
 
         return obj
 
+    def decode_ndjson(self, response):
+        """Generator yielding each record of an NDJSON response"""
+
+        try:
+            for line in response.iter_lines():
+                if not line.strip():
+                    continue
+                try:
+                    obj = json.loads(line)
+                except:
+                    raise self.error(response,
+                            "Could not decode response")
+                if self.use_attrdict:
+                    if isinstance(obj, dict) or isinstance(obj, list):
+                        obj = AttrDict(obj)
+                yield obj
+        finally:
+            response.close()
+
+    def decode_events(self, response, last_id=None):
+        """Generator yielding each event of a text/event-stream response
+
+           :param response: requests.Response object
+           :param last_id: id of the last event received before
+                  reconnecting, if any
+        """
+
+        try:
+            for evt in sse.parse(response.iter_lines(chunk_size=None),
+                                 last_id):
+                if evt.data is None:
+                    yield evt
+                    continue
+                try:
+                    evt.data = json.loads(evt.data)
+                except ValueError:
+                    pass
+                else:
+                    if self.use_attrdict:
+                        if isinstance(evt.data, (dict, list)):
+                            evt.data = AttrDict(evt.data)
+                yield evt
+        finally:
+            response.close()
+
     def baseurl_params(self, path):
         """Construct the base URL of a resource (excluding URL params)"""
 
@@ -174,7 +565,7 @@ class BeanBag(HierarchialNS):
         return url
 
     def path(self):
-        return ("", {})
+        return ("", _noparams)
 
     def attr(self, attr):
         """Special processing for attribute access
@@ -199,15 +590,29 @@ class BeanBag(HierarchialNS):
         """Set URL parameters"""
 
         url, params = path
-        newparams = params.copy()
+        changes = []
         for a in tuple(args) + (kwargs,):
-            for k, v in a.items():
-                if v is not None:
-                    newparams[k] = v
-                elif k in newparams:
-                    del newparams[k]
+            changes.extend(a.items())
+        if not changes:
+            return self.namespace(path)
+
+        return self.namespace((url, Params(params, changes)))
+
+    def reduce_ex(self, path, protocol):
+        """Pickle as the BeanBag's configuration, attributes and the path
 
-        return self.namespace((url, newparams))
+           The session, tracer and error aggregator are not pickled; an
+           unpickled BeanBag uses a new requests.Session, so that
+           resources can be passed to worker processes without copying
+           connections or other live state.
+        """
+
+        state = dict((k, v) for k, v in self.__dict__.items()
+                     if k not in _setup_attrs)
+        state["formats"] = [
+                f.name if codec.codecs.get(getattr(f, "name", None)) is f
+                else f for f in self.formats]
+        return (_rebuild, (self.Namespace, self.config, state, path))
 
     def invert(self, path):
         """Provide access to the base/path via the namespace object
@@ -228,11 +633,21 @@ class BeanBag(HierarchialNS):
     def make_request(self, path, verb, request):
         """Make a REST request to a resource"""
 
+        if verb not in ("GET", "HEAD", "OPTIONS"):
+            snap = snapshot.active(self)
+            if snap is not None:
+                snap.invalidate(path[0])
+
         url, params = self.baseurl_params(path)
 
         assert isinstance(request, Request)
         request = +request   # convert to dictionary
 
-        return self.session.request(
-                method=verb, url=url, params=params, **request)
-
+        try:
+            if self.tracer is not None:
+                return self.tracer.send(self.session, method=verb, url=url,
+                                        params=params.copy(), **request)
+            return self.session.request(
+                    method=verb, url=url, params=params.copy(), **request)
+        except BeanBagException as e:   # eg, from beanbag.breaker
+            raise self.error(e.response, e.msg, verb, url)
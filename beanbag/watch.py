@@ -0,0 +1,206 @@
+# Copyright (c) 2015 Anthony Towns
+# Written by Anthony Towns <aj@erisian.com.au>
+# See LICENSE file.
+
+"""Watch v2 BeanBag resources for changes using conditional requests."""
+
+import heapq
+import itertools
+import threading
+import time
+
+__all__ = ['Watch', 'watch', 'Watcher']
+
+
+class Watch(object):
+    """Polling state for a single resource.
+
+       Each ``poll()`` makes a conditional GET request, using the ETag
+       and Last-Modified validators from the previous response, so an
+       unchanged resource costs a 304 response rather than a full body.
+       The delay before the next poll grows by ``backoff`` each time
+       nothing has changed, up to ``max_interval``, and drops back to
+       ``interval`` on a change. ``Retry-After`` headers are respected.
+
+       If ``wait`` is set, the request asks the server to hold the
+       request open for up to that many seconds until the resource
+       changes (``Prefer: wait=N``, RFC 7240); if the server indicates it
+       did so, the next poll is made immediately.
+
+       Data members:
+         * value   -- most recently fetched value
+         * delay   -- seconds until the next poll should be made
+         * polls   -- number of requests made
+         * changes -- number of times a change was seen
+    """
+
+    def __init__(self, url, interval=1.0, max_interval=60.0, backoff=2.0,
+                 wait=None):
+        self.url = url
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.wait = wait
+
+        self.etag = None
+        self.last_modified = None
+        self.value = None
+        self.delay = 0
+        self.polls = 0
+        self.changes = 0
+
+    def _slower(self):
+        self.delay = min(self.max_interval,
+                         max(self.delay, self.interval) * self.backoff)
+
+    def poll(self):
+        """Fetch the resource if it has changed
+
+           Returns True (and updates ``value``) if the resource changed.
+        """
+
+        base, path = ~self.url
+        req = base.encode(None)
+        if self.etag is not None:
+            req.headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            req.headers["If-Modified-Since"] = self.last_modified
+        if self.wait is not None:
+            req.headers["Prefer"] = "wait=%d" % (self.wait,)
+
+        res = base.make_request(path, "GET", req)
+        self.polls += 1
+
+        long_polled = "wait" in res.headers.get("preference-applied", "")
+        retry_after = res.headers.get("retry-after")
+
+        if res.status_code == 304:
+            if long_polled:
+                self.delay = 0
+            else:
+                self._slower()
+            return False
+
+        if res.status_code in (429, 503) and retry_after is not None:
+            try:
+                self.delay = float(retry_after)
+            except ValueError:
+                self._slower()
+            return False
+
+        value = base.decode(res)
+        self.etag = res.headers.get("etag")
+        self.last_modified = res.headers.get("last-modified")
+
+        if (self.changes and self.etag is None and
+                self.last_modified is None and value == self.value):
+            self._slower()
+            return False
+
+        self.value = value
+        self.changes += 1
+        self.delay = 0 if long_polled else self.interval
+        return True
+
+
+def watch(url, interval=1.0, max_interval=60.0, backoff=2.0, wait=None):
+    """Generator yielding a resource's value each time it changes
+
+       :Example:
+
+       >>> for job in watch(myapi.jobs[x]):
+       ...     if job.state == "done":
+       ...         break
+
+       See ``Watch`` for the meaning of the parameters.
+    """
+
+    w = Watch(url, interval, max_interval, backoff, wait)
+    while True:
+        if w.poll():
+            yield w.value
+        if w.delay:
+            time.sleep(w.delay)
+
+
+class Watcher(object):
+    """Watch many resources from a single scheduler thread
+
+       :Example:
+
+       >>> watcher = Watcher()
+       >>> watcher.add(myapi.jobs[1], lambda job: print(job.state))
+       >>> watcher.add(myapi.jobs[2], lambda job: print(job.state))
+       ...
+       >>> watcher.stop()
+
+       Callbacks are run in the scheduler thread, so should be quick. If
+       polling raises an exception, ``on_error(watch, exc)`` is called,
+       and the resource is polled again after backing off. Long polling
+       is not used, since it would hold up the shared thread.
+    """
+
+    def __init__(self, on_error=None):
+        self.on_error = on_error
+        self.cond = threading.Condition()
+        self.queue = []
+        self.counter = itertools.count()
+        self.callbacks = {}
+        self.running = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def add(self, url, callback, interval=1.0, max_interval=60.0,
+            backoff=2.0):
+        """Start watching a resource, returning its Watch object"""
+
+        w = Watch(url, interval, max_interval, backoff)
+        with self.cond:
+            self.callbacks[w] = callback
+            heapq.heappush(self.queue, (time.time(), next(self.counter), w))
+            self.cond.notify()
+        return w
+
+    def remove(self, w):
+        """Stop watching a resource"""
+
+        with self.cond:
+            self.callbacks.pop(w, None)
+
+    def stop(self):
+        """Stop the scheduler thread"""
+
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+        self.thread.join()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while self.running:
+                    now = time.time()
+                    if self.queue and self.queue[0][0] <= now:
+                        break
+                    timeout = self.queue[0][0] - now if self.queue else None
+                    self.cond.wait(timeout)
+                if not self.running:
+                    return
+                _, _, w = heapq.heappop(self.queue)
+                callback = self.callbacks.get(w)
+            if callback is None:
+                continue
+
+            try:
+                if w.poll():
+                    callback(w.value)
+            except Exception as e:
+                w._slower()
+                if self.on_error is not None:
+                    self.on_error(w, e)
+
+            with self.cond:
+                if w in self.callbacks:
+                    heapq.heappush(self.queue, (time.time() + w.delay,
+                                                next(self.counter), w))
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+
+# asyncio support for fake_req.SimulatedSession, kept separate so that
+# fake_req can still be imported by Pythons without async syntax
+
+import asyncio
+
+async def arequest(self, method, url, params=None, data=None,
+                   headers=None, timeout=None, **kwargs):
+    delay, result = self._plan(method, url, params, data, headers,
+                               timeout)
+    slots = None
+    if self.max_connections is not None:
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            slots = self.async_slots.get(loop)
+            if slots is None:
+                slots = asyncio.Semaphore(self.max_connections)
+                self.async_slots[loop] = slots
+        await slots.acquire()
+    try:
+        self._enter()
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._exit()
+    finally:
+        if slots is not None:
+            slots.release()
+    return self._finish(method, url, delay, result)
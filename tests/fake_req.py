@@ -1,6 +1,20 @@
 #!/usr/bin/env python
 
+import datetime
 import json
+import math
+import random
+import sys
+import threading
+import time
+
+import requests
+
+try:
+    from SocketServer import ThreadingMixIn, TCPServer as HTTPServer
+except ImportError:
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
 
 class FakeResponse(object):
     def __init__(self, status_code=200, content={}):
@@ -11,6 +25,15 @@ class FakeResponse(object):
         self.text = self.content = content
         self.status_code = status_code
 
+    def iter_lines(self, chunk_size=512):
+        content = self.content
+        if not isinstance(content, bytes):
+            content = content.encode("utf-8")
+        return iter(content.splitlines())
+
+    def close(self):
+        pass
+
 _Any = object()
 
 class FakeSession(object):
@@ -43,7 +66,8 @@ class FakeSession(object):
                 data=data,
                 headers=request.headers)
 
-    def request(self, method, url, params=None, data=None, headers=None):
+    def request(self, method, url, params=None, data=None, headers=None,
+                stream=False):
         assert self.expecting is not None, \
                 "Unexpected request: %s %s %s %s" % (method, url, params, data)
 
@@ -76,3 +100,211 @@ class FakeSession(object):
             res_obj = str(params["result"])
 
         return FakeResponse(status_code=status_code, content=res_obj)
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class LocalServer(object):
+    """Run an HTTP server on localhost for the duration of a with block"""
+
+    def __init__(self, handler):
+        self.server = _ThreadingServer(("127.0.0.1", 0), handler)
+        self.port = self.server.server_address[1]
+        self.url = "http://127.0.0.1:%d/" % (self.port,)
+
+    def __enter__(self):
+        t = threading.Thread(target=self.server.serve_forever)
+        t.daemon = True
+        t.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SimulatedResponse(object):
+    def __init__(self, method, url, status_code, content, elapsed,
+                 content_type="application/json"):
+        if not isinstance(content, bytes):
+            content = content.encode("utf-8")
+        self.status_code = status_code
+        self.reason = "OK" if status_code < 400 else "Error"
+        self.headers = requests.structures.CaseInsensitiveDict(
+                {"content-type": content_type,
+                 "content-length": str(len(content))})
+        self.content = content
+        self.url = url
+        self.method = method
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+        self.closed = False
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def iter_lines(self, chunk_size=512):
+        return iter(self.content.splitlines())
+
+    def close(self):
+        self.closed = True
+
+def echo(method, url, params, data, headers):
+    """Default SimulatedSession handler: describe the request as JSON"""
+
+    return 200, json.dumps(dict(method=method, url=url, params=params,
+                                data=data))
+
+class SimulatedSession(object):
+    """Fake session simulating a backend with realistic performance
+
+       Every request is delayed by a latency drawn from ``distribution``
+       ("fixed", "uniform", "exponential" or "lognormal", or a function
+       taking a random.Random and returning seconds) with mean
+       ``latency``, plus up to +/- ``jitter`` seconds, plus the time to
+       transfer the request and response bodies at ``bandwidth`` bytes
+       per second. A proportion ``error_rate`` of requests get an
+       ``error_status`` response, and ``timeout_rate`` hang until the
+       request's timeout (or ``timeout``) and then raise
+       ``requests.exceptions.ReadTimeout``. At most ``max_connections``
+       requests are served at once; others wait for a connection.
+
+       Random choices are made from a generator seeded from ``seed`` and
+       the request's method, URL and how many times it has been made,
+       so results don't depend on thread scheduling. Pass ``sleep`` to
+       use a simulated clock rather than actually waiting.
+
+       ``request()`` may be called from many threads at once, and
+       ``arequest()`` (see fake_async.py) from asyncio code.
+    """
+
+    def __init__(self, handler=echo, latency=0.0, distribution="fixed",
+                 jitter=0.0, bandwidth=None, error_rate=0.0,
+                 error_status=503, timeout_rate=0.0, timeout=30.0,
+                 max_connections=None, seed=0, sleep=time.sleep):
+        self.headers = {}
+        self.handler = handler
+        self.latency = latency
+        self.distribution = distribution
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.seed = seed
+        self.sleep = sleep
+
+        self.lock = threading.Lock()
+        self.seen = {}
+        self.slots = None
+        if max_connections is not None:
+            self.slots = threading.BoundedSemaphore(max_connections)
+        self.async_slots = {}
+
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def _delay(self, rng):
+        d = self.distribution
+        mean = self.latency
+        if callable(d):
+            t = d(rng)
+        elif d == "fixed":
+            t = mean
+        elif d == "uniform":
+            t = rng.uniform(0, 2 * mean)
+        elif d == "exponential":
+            t = rng.expovariate(1.0 / mean) if mean > 0 else 0.0
+        elif d == "lognormal":
+            sigma = 1.0
+            t = rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma) \
+                    if mean > 0 else 0.0
+        else:
+            raise ValueError("unknown distribution: %s" % (d,))
+        if self.jitter:
+            t += rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, t)
+
+    def _plan(self, method, url, params, data, headers, timeout):
+        """Decide how a request will be handled, before serving it"""
+
+        with self.lock:
+            n = self.seen.get((method, url), 0)
+            self.seen[(method, url)] = n + 1
+            self.requests += 1
+        rng = random.Random("%s %s %s %d" % (self.seed, method, url, n))
+
+        delay = self._delay(rng)
+        if isinstance(timeout, tuple):   # (connect, read)
+            timeout = timeout[1]
+        if rng.random() < self.timeout_rate:
+            with self.lock:
+                self.timeouts += 1
+            return min(timeout or self.timeout, self.timeout), None
+
+        if rng.random() < self.error_rate:
+            with self.lock:
+                self.errors += 1
+            status, body = self.error_status, '{"error": "simulated"}'
+        else:
+            status, body = self.handler(method, url, params, data, headers)
+
+        if self.bandwidth:
+            size = len(body) + len(data or b"")
+            delay += float(size) / self.bandwidth
+        return delay, (status, body)
+
+    def _enter(self):
+        with self.lock:
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+
+    def _exit(self):
+        with self.lock:
+            self.inflight -= 1
+
+    def _finish(self, method, url, delay, result):
+        if result is None:
+            raise requests.exceptions.ReadTimeout(
+                    "simulated timeout after %.3fs" % (delay,))
+        status, body = result
+        return SimulatedResponse(method, url, status, body, delay)
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                timeout=None, **kwargs):
+        delay, result = self._plan(method, url, params, data, headers,
+                                   timeout)
+        if self.slots is not None:
+            self.slots.acquire()
+        try:
+            self._enter()
+            try:
+                self.sleep(delay)
+            finally:
+                self._exit()
+        finally:
+            if self.slots is not None:
+                self.slots.release()
+        return self._finish(method, url, delay, result)
+
+if sys.version_info >= (3, 7):
+    from fake_async import arequest
+    SimulatedSession.arequest = arequest
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+from beanbag.v2 import BeanBag, GET
+from fake_req import FakeResponse
+
+class RecordingSession(object):
+    def __init__(self, bad=()):
+        self.headers = {}
+        self.urls = []
+        self.bad = bad
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        self.urls.append(url)
+        for b in self.bad:
+            if url.startswith(b):
+                raise IOError("connection refused")
+        return FakeResponse(content=dict(url=url))
+
+def test_balance():
+    s = RecordingSession(bad=("http://b.example.org/",))
+    urls = ["http://a.example.org/api", "http://b.example.org/api"]
+    b = BeanBag(urls, session=s)
+    bal = (~b)[0].session
+    bal.eject_time = 3600
+
+    assert str(b.foo) == "http://a.example.org/api/foo"
+
+    ok = 0
+    for i in range(20):
+        try:
+            r = GET(b.foo)
+            assert r.url == "http://a.example.org/api/foo"
+            ok += 1
+        except IOError:
+            pass
+
+    assert ok >= 20 - bal.max_failures
+    stats = bal.stats()
+    assert [n["ejected"] for n in stats] == [False, True]
+    assert stats[1]["errors"] == bal.max_failures
+    assert sum(n["requests"] for n in stats) == 20
@@ -1,9 +1,15 @@
 #!/usr/bin/env python
 
-import py.test
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+except ImportError:
+    from http.server import BaseHTTPRequestHandler
+
+import pytest
+import threading
 import beanbag.v1 as beanbag
 import json
-from fake_req import FakeSession, _Any
+from fake_req import FakeSession, LocalServer, _Any
 
 def test_bb():
     s = FakeSession()
@@ -36,3 +42,82 @@ def test_bb():
     except beanbag.BeanBagException as e:
         assert e.msg == "Could not decode response"
 
+
+def test_ndjson():
+    class NDJSONSession(FakeSession):
+        def request(self, *args, **kwargs):
+            r = FakeSession.request(self, *args, **kwargs)
+            r.headers = {"content-type": "application/x-ndjson"}
+            r.text = r.content = '{"n": 0}\n{"n": 1}\n'
+            return r
+
+    s = NDJSONSession()
+    b = beanbag.BeanBag("http://www.example.org/path/", session=s)
+    s.expect("GET", "http://www.example.org/path/export")
+    assert list(b.export()) == [{"n": 0}, {"n": 1}]
+
+    class Lines(object):
+        status_code = 200
+        headers = {"content-type": "application/x-ndjson"}
+
+        def __init__(self):
+            self.read = []
+
+        @property
+        def content(self):
+            raise AssertionError("whole body read")
+
+        def iter_lines(self):
+            for line in [b'{"n": 0}', b'{"n": 1}']:
+                self.read.append(line)
+                yield line
+
+        def close(self):
+            pass
+
+    class LinesSession(object):
+        headers = {}
+
+        def request(self, *args, **kwargs):
+            self.response = Lines()
+            return self.response
+
+    s = LinesSession()
+    b = beanbag.BeanBag("http://www.example.org/path/", session=s)
+    records = b.export()
+    assert next(records) == {"n": 0}
+    assert s.response.read == [b'{"n": 0}']
+    assert list(records) == [{"n": 1}]
+
+def test_ndjson_server():
+    first_read = threading.Event()
+    sent = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            assert "application/x-ndjson" in self.headers["Accept"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for n in range(3):
+                line = ('{"n": %d}\n' % (n,)).encode("ascii")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+                sent.append(n)
+                if n == 0:
+                    first_read.wait(5)
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    with LocalServer(Handler) as srv:
+        b = beanbag.BeanBag(srv.url)
+        records = b.export()
+        assert next(records) == {"n": 0}
+        assert sent == [0]
+        first_read.set()
+        assert list(records) == [{"n": 1}, {"n": 2}]
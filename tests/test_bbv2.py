@@ -1,10 +1,10 @@
 #!/usr/bin/env python
 
 import pytest
-from beanbag.v2 import BeanBag, BeanBagException, GET, POST, PUT, PATCH, DELETE
+from beanbag.v2 import BeanBag, BeanBagException, NDJSON, GET, POST, PUT, PATCH, DELETE
 from beanbag.attrdict import AttrDict
 import json
-from fake_req import FakeSession, _Any
+from fake_req import FakeSession, FakeResponse, _Any
 
 def test_bb():
     s = FakeSession()
@@ -67,3 +67,65 @@ def test_sane_inheritance():
     r = POST(bb.foo, dict(a=1))
     assert type(r) is AttrDict
     assert r.data == '{"a": 1}' and r.method == 'POST'
+
+def test_streaming_body():
+    class StreamSession(object):
+        def request(self, method, url, params=None, data=None, headers=None):
+            self.headers = headers
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            self.body = data if isinstance(data, bytes) else b"".join(data)
+            return FakeResponse(content={})
+
+    s = StreamSession()
+    b = BeanBag("http://www.example.org/path/", session=s)
+
+    POST(b.bulk, (dict(n=i) for i in range(3)))
+    assert s.headers["Content-Type"] == "application/json"
+    assert json.loads(s.body.decode("utf-8")) == [{"n": 0}, {"n": 1}, {"n": 2}]
+
+    POST(b.bulk, NDJSON(iter([AttrDict({"n": 0}), {"n": 1}])))
+    assert s.headers["Content-Type"] == "application/x-ndjson"
+    assert s.body == b'{"n": 0}\n{"n": 1}\n'
+
+    POST(b.bulk, AttrDict({"a": 1, "b": 2}))
+    assert s.headers["Content-Type"] == "application/json"
+    assert json.loads(s.body.decode("utf-8")) == {"a": 1, "b": 2}
+
+def test_ndjson_response():
+    class NDJSONSession(object):
+        def request(self, method, url, params=None, data=None, headers=None):
+            r = FakeResponse(content='{"n": 0}\n\n{"n": 1}\n')
+            r.headers = {"content-type": "application/x-ndjson"}
+            return r
+
+    b = BeanBag("http://www.example.org/path/", session=NDJSONSession())
+    records = GET(b.export)
+    assert not isinstance(records, (list, AttrDict))
+    records = list(records)
+    assert [type(r) for r in records] == [AttrDict, AttrDict]
+    assert [r.n for r in records] == [0, 1]
+
+def test_hashable_paths():
+    s = FakeSession()
+    b = BeanBag("http://www.example.org/path/", session=s)
+
+    cache = {b.foo(a=1)(b=2): "x"}
+    assert cache[b.foo(b=2, a=1)] == "x"
+    assert b.foo(a=1) != b.foo(a=2)
+    assert b.foo(a=1)(a=None) == b.foo
+    assert hash(b.foo(a=1)(a=None)) == hash(b.foo)
+    assert b.foo not in {BeanBag("http://www.example.org/path/").foo: 1}
+    hash(b.foo(ids=[1, 2]))
+
+    foo = b.foo(a=1)
+    base, (url, params) = ~foo
+    base, (url2, params2) = ~foo.bar(c=3)
+    assert params2.parent is params
+    assert dict(params2) == dict(a=1, c=3)
+
+    s.expect("GET", "http://www.example.org/path/foo", params=dict(a=2, c=3))
+    GET(b.foo(a=1, b=2)(b=None, c=3)(a=2))
+
+    with pytest.raises(TypeError):
+        hash(AttrDict({"a": 1}))
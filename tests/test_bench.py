@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import json
+import os
+
+from beanbag import bench
+
+def test_mix():
+    mix = bench.parse_mix("get=3,POST=1,put")
+    assert mix == [("GET", 3.0), ("POST", 1.0), ("PUT", 1.0)]
+
+    ops = bench.synthetic(mix, 100, 1000, seed=1)
+    assert ops == bench.synthetic(mix, 100, 1000, seed=1)
+    verbs = [op[0] for op in ops]
+    assert 500 < verbs.count("GET") < 700
+    assert all(len(json.dumps(op[3])) == 100 for op in ops if op[3])
+
+def test_categorise():
+    assert bench.categorise("/x/beanbag/namespace.py") == "dispatch"
+    assert bench.categorise("/usr/lib/python3/json/decoder.py") == "codec"
+    assert bench.categorise("/x/urllib3/connectionpool.py") == "transport"
+    assert bench.categorise("/x/beanbag/session.py") == "transport"
+    assert bench.categorise("~", "<method 'recv_into' of '_socket.socket' "
+                                 "objects>") == "transport"
+    assert bench.categorise("/x/myapp.py") == "other"
+    assert bench.categorise("/x/beanbag/bench.py") == "other"
+
+def test_run(tmpdir):
+    replay = tmpdir.join("replay.jsonl")
+    replay.write('{"method": "GET", "path": "users/1", "params": {"a": 1}}\n'
+                 '{"method": "POST", "path": "users", "body": {"n": 1}}\n')
+    stub, url = bench.start_stub(2000)
+    try:
+        for api in ("v1", "v2"):
+            res = bench.run(url, bench.load_replay(str(replay)) * 10,
+                            api=api, concurrency=4, profile=True)
+            assert res["requests"] == 20
+            assert res["errors"] == 0
+            assert res["p50"] <= res["p95"] <= res["p99"]
+            assert res["cpu_per_request"] > 0
+            split = bench.profile_split(res["stats"])
+            assert split["transport"] > 0 and split["dispatch"] > 0
+            if res["profile_clock"] == "cpu":
+                cpu = res["cpu_per_request"] * res["requests"]
+                assert sum(split.values()) <= cpu * 1.1
+    finally:
+        stub.terminate()
+
+def test_thread_scan():
+    stub, url = bench.start_stub(100)
+    try:
+        for api in ("v1", "v2"):
+            with open(os.devnull, "w") as out:
+                res = bench.thread_scan(url, api, max_threads=4,
+                                        requests=40, out=out)
+            assert [n for n, rate, conns, errors in res] == [1, 2, 4]
+            assert all(errors == 0 for n, rate, conns, errors in res)
+            assert all(conns <= n for n, rate, conns, errors in res)
+    finally:
+        stub.terminate()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+import pytest
+
+from beanbag.bbexcept import ErrorAggregator
+from beanbag.breaker import BreakerSession, CircuitBreaker
+from beanbag.v2 import BeanBag, BeanBagException, GET
+from fake_req import FakeResponse
+
+class FlakySession(object):
+    def __init__(self):
+        self.headers = {}
+        self.bad = set()
+        self.calls = []
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        self.calls.append(url)
+        for b in self.bad:
+            if b in url:
+                raise IOError("timed out")
+        return FakeResponse(content={})
+
+class Clock(object):
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_breaker():
+    clock = Clock()
+    b = CircuitBreaker(window=10, min_requests=4, error_rate=0.5,
+                       open_time=30, probes=2)
+    b.time = clock
+
+    for ok in (True, False, True):
+        assert b.allow()
+        b.record(ok, 0.1)
+    assert b.state == "closed"
+    assert b.allow()
+    b.record(False, 0.1)
+    assert b.state == "open"
+    assert not b.allow()
+
+    clock.now += 31
+    assert b.allow() and b.allow()
+    assert b.state == "half-open"
+    assert not b.allow()           # only two probes at a time
+    b.record(True, 0.1)
+    b.record(False, 0.1)
+    assert b.state == "open"
+
+    clock.now += 31
+    assert b.allow() and b.allow()
+    b.record(True, 0.1)
+    b.record(True, 0.1)
+    assert b.state == "closed"
+    assert b.stats() == dict(state="closed", requests=0, failed=0,
+                             opened=2, refused=2)
+
+def test_slow():
+    b = CircuitBreaker(min_requests=2, slow_call=1.0, slow_rate=0.5)
+    b.record(True, 0.5)
+    b.record(True, 2.0)
+    assert b.state == "open"
+
+def test_session():
+    s = FlakySession()
+    session = BreakerSession(s, min_requests=3, open_time=60)
+    errors = ErrorAggregator()
+    bb = BeanBag("http://www.example.org/api/", session=session,
+                 errors=errors)
+
+    s.bad.add("/users/")
+    for i in range(3):
+        with pytest.raises(IOError):
+            GET(bb.users[i])
+    calls = len(s.calls)
+    with pytest.raises(BeanBagException) as e:
+        GET(bb.users[7])
+    assert len(s.calls) == calls   # failed fast
+    assert "users/{id}" in str(e.value)
+    assert errors.most_common() == [
+        (("GET", "http://www.example.org/api/users/{id}", None), 1)]
+
+    GET(bb.orgs[1])                # other endpoints unaffected
+    stats = session.stats()
+    assert stats["http://www.example.org/api/users/{id}"]["state"] == "open"
+    assert stats["http://www.example.org/api/orgs/{id}"]["state"] == "closed"
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import pytest
+
+from beanbag.attrdict import AttrDict
+from beanbag.codec import JSON, MSGPACK, CBOR, lookup
+from beanbag.v2 import BeanBag, GET, POST
+from fake_req import FakeResponse
+
+class CodecSession(object):
+    """Echoes the request body back in the format named by Accept"""
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        self.headers = headers
+        fmt = lookup(headers["Accept"].split(",")[0])
+        req = lookup(headers.get("Content-Type", "json"))
+        body = req.loads(data) if data is not None else None
+        r = FakeResponse(content="")
+        r.content = fmt.encode(dict(method=method, body=body))
+        r.headers = {"content-type": fmt.mime}
+        return r
+
+def test_lookup():
+    assert lookup("json") is JSON
+    assert lookup("application/x-msgpack") is MSGPACK
+    with pytest.raises(ValueError):
+        lookup("text/html")
+
+def test_negotiation():
+    pytest.importorskip("msgpack")
+    pytest.importorskip("cbor2")
+
+    s = CodecSession()
+    b = BeanBag("http://www.example.org/path/", session=s,
+                formats=["msgpack", "json"])
+    base, path = ~b
+    assert base.accept() == "application/msgpack, application/json;q=0.9"
+
+    r = POST(b.foo, {"a": 1})
+    assert s.headers["Content-Type"] == "application/msgpack"
+    assert type(r) is AttrDict and r.body.a == 1
+
+    r = POST(b.foo, JSON({"a": 2}))
+    assert s.headers["Content-Type"] == "application/json"
+    assert s.headers["Accept"].startswith("application/json,")
+    assert r.body.a == 2
+
+    r = GET(b.foo, CBOR(None))   # cbor is not one of the BeanBag's formats
+    assert s.headers["Accept"].startswith("application/cbor,")
+    assert r.method == "GET" and r.body is None
+
+    r = POST(b.foo, iter([{"n": 0}, AttrDict({"n": 1})]))
+    assert s.headers["Content-Type"] == "application/msgpack"
+    assert r.body == [{"n": 0}, {"n": 1}]
+
+class BytesResponse(object):
+    def __init__(self, content, ctype):
+        self.content = content
+        self.headers = {"content-type": ctype}
+
+    @property
+    def text(self):
+        raise AssertionError("decoding should not touch response.text")
+
+def test_json_bytes():
+    doc = {"name": u"café", "n": [1, 2]}
+    body = u'{"name": "café", "n": [1, 2]}'
+
+    for ctype, enc in [("application/json", "utf-8"),
+                       ("application/json; charset=UTF-8", "utf-8"),
+                       ("application/json; charset=utf-16", "utf-16"),
+                       ('application/json; charset="latin-1"', "latin-1"),
+                       ("application/vnd.api+json", "utf-8"),
+                       ("application/json; charset=x-bogus", "utf-8"),
+                       ("application/json; charset=iso-2022-jp", "utf-8")]:
+        assert JSON.decode(BytesResponse(body.encode(enc), ctype)) == doc
+
+def test_decode_override():
+    class MyBeanBag(BeanBag):
+        def decode(self, response):
+            return (~BeanBag).decode(self, response)
+
+    b = MyBeanBag("http://www.example.org/path/", session=CodecSession())
+    assert GET(b.foo).method == "GET"
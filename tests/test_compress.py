@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+import json
+import pytest
+import requests
+
+from beanbag import compress
+from beanbag.v2 import BeanBag
+
+def test_roundtrip():
+    for enc in compress.available():
+        data = b'{"a": 1}' * 100
+        assert compress.decompress(compress.compress(data, enc), enc) == data
+    assert "gzip" in compress.accept_encoding()
+    with pytest.raises(ValueError):
+        compress.compress(b"", "lzma-but-not-really")
+
+def test_encode_threshold():
+    b = BeanBag("http://www.example.org/path/", session=requests.Session(),
+                compression="gzip", compress_threshold=100)
+    base, path = ~b
+
+    req = base.encode({"a": 1})
+    assert "Content-Encoding" not in req.headers
+    assert json.loads(req.data) == {"a": 1}
+
+    req = base.encode({"a": "x" * 200})
+    assert req.headers["Content-Encoding"] == "gzip"
+    assert json.loads(compress.decompress(req.data, "gzip").decode("utf-8")) == {"a": "x" * 200}
+
+def test_decompress_response():
+    enc = [e for e in compress.decompressors if e not in compress.transport_encodings]
+    if not enc:
+        pytest.skip("transport decodes all available encodings")
+    r = requests.Response()
+    r.status_code = 200
+    r.headers["content-type"] = "application/json"
+    r.headers["content-encoding"] = enc[0]
+    r._content = compress.compress(b'{"a": 1}', enc[0])
+
+    b = BeanBag("http://www.example.org/path/", session=requests.Session())
+    base, path = ~b
+    assert +base.decode(r) == {"a": 1}
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+import os
+import pytest
+import threading
+
+from beanbag.bbexcept import ErrorAggregator
+from beanbag.download import DOWNLOAD
+from beanbag.v2 import BeanBag, BeanBagException
+
+class BlobResponse(object):
+    def __init__(self, status_code, headers, body=b""):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = body
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+class BlobSession(object):
+    def __init__(self, blob, ranges=True, fail=None, etag='"v1"',
+                 last_modified=None):
+        self.blob = blob
+        self.ranges = ranges
+        self.fail = fail
+        self.etag = etag
+        self.last_modified = last_modified
+        self.lock = threading.Lock()
+        self.seen = []
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                stream=False):
+        assert stream
+        hdrs = {"content-length": str(len(self.blob))}
+        if self.etag:
+            hdrs["etag"] = self.etag
+        if self.last_modified:
+            hdrs["last-modified"] = self.last_modified
+        if self.ranges:
+            hdrs["accept-ranges"] = "bytes"
+        if method == "HEAD":
+            return BlobResponse(200, hdrs)
+        rng = headers.get("Range")
+        with self.lock:
+            self.seen.append(rng)
+        if rng is None or not self.ranges:
+            return BlobResponse(200, hdrs, self.blob)
+        if self.etag and not self.etag.startswith("W/"):
+            assert headers["If-Range"] == self.etag
+        else:
+            assert headers.get("If-Range") == self.last_modified
+        start, end = [int(x) for x in rng.split("=")[1].split("-")]
+        if start == self.fail:
+            return BlobResponse(500, {})
+        crange = "bytes %d-%d/%d" % (start, end, len(self.blob))
+        return BlobResponse(206, {"content-range": crange},
+                            self.blob[start:end + 1])
+
+blob = bytes(bytearray(i % 251 for i in range(10000)))
+
+def test_download_ranged(tmpdir):
+    fn = str(tmpdir.join("blob"))
+    s = BlobSession(blob, fail=4096)
+    errors = ErrorAggregator()
+    b = BeanBag("http://www.example.org/path/", session=s, errors=errors)
+
+    with pytest.raises(BeanBagException):
+        DOWNLOAD(b.blob, fn, part_size=1024, chunk_size=100)
+    assert not os.path.exists(fn)
+    assert errors.total() == 1
+    assert len(s.seen) == 10
+
+    s.fail = None
+    s.seen = []
+    assert DOWNLOAD(b.blob, fn, part_size=1024, chunk_size=100) == fn
+    assert s.seen == ["bytes=4096-5119"]
+    assert open(fn, "rb").read() == blob
+    assert os.listdir(str(tmpdir)) == ["blob"]
+
+def test_download_single(tmpdir):
+    fn = str(tmpdir.join("blob"))
+    s = BlobSession(blob, ranges=False)
+    b = BeanBag("http://www.example.org/path/", session=s)
+
+    DOWNLOAD(b.blob, fn)
+    assert s.seen == [None]
+    assert open(fn, "rb").read() == blob
+
+def test_download_weak_etag(tmpdir):
+    fn = str(tmpdir.join("blob"))
+    date = "Wed, 21 Oct 2015 07:28:00 GMT"
+    for last_modified in (date, None):
+        s = BlobSession(blob, etag='W/"v1"', last_modified=last_modified)
+        b = BeanBag("http://www.example.org/path/", session=s)
+        assert DOWNLOAD(b.blob, fn, part_size=4096) == fn
+        assert open(fn, "rb").read() == blob
+        os.remove(fn)
+
+    # without a validator, a change in size is spotted via Content-Range
+    class GrowingSession(BlobSession):
+        def request(self, method, url, **kwargs):
+            res = BlobSession.request(self, method, url, **kwargs)
+            if method == "HEAD":
+                self.blob = blob + b"more"
+            return res
+
+    s = GrowingSession(blob, etag=None)
+    b = BeanBag("http://www.example.org/path/", session=s)
+    with pytest.raises(BeanBagException) as e:
+        DOWNLOAD(b.blob, fn, part_size=4096)
+    assert "changed" in e.value.msg
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+import pytest
+
+from beanbag.bbexcept import CapturedResponse, ErrorAggregator
+from beanbag.v2 import BeanBag, BeanBagException, GET
+import beanbag.v1
+from fake_req import FakeResponse
+
+class ErrorResponse(FakeResponse):
+    def __init__(self, url, status_code, body):
+        FakeResponse.__init__(self, status_code, body)
+        self.url = url
+        self.headers = {"content-type": "text/plain", "x-request-id": "r1"}
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size].encode("utf-8")
+
+    def close(self):
+        self.closed = True
+
+class ErrorSession(object):
+    def __init__(self):
+        self.headers = {}
+        self.responses = []
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                stream=False):
+        status = 404 if "missing" in url else 500
+        r = ErrorResponse(url, status, "x" * 100000)
+        self.responses.append(r)
+        return r
+
+def test_capture():
+    s = ErrorSession()
+    b = BeanBag("http://www.example.org/api/", session=s,
+                capture_errors=100)
+
+    with pytest.raises(BeanBagException) as e:
+        GET(b.items[12])
+
+    res = e.value.response
+    assert isinstance(res, CapturedResponse)
+    assert res.status_code == 500
+    assert res.headers["x-request-id"] == "r1"
+    assert res.content == b"x" * 100
+    assert res.truncated
+    assert res.url == "http://www.example.org/api/items/12"
+    assert s.responses[0].closed
+    assert len(str(e.value)) < 200
+
+def test_uncaptured():
+    s = ErrorSession()
+    b = BeanBag("http://www.example.org/api/", session=s)
+    with pytest.raises(BeanBagException) as e:
+        GET(b.items[12])
+    assert e.value.response is s.responses[0]
+
+def test_aggregate():
+    errors = ErrorAggregator(max_keys=2)
+    s = ErrorSession()
+    b = BeanBag("http://www.example.org/api/", session=s, errors=errors,
+                capture_errors=True)
+
+    for i in range(5):
+        for url in (b.items[i], b.missing[i], b.missing[i](q=1)):
+            with pytest.raises(BeanBagException):
+                GET(url)
+    with pytest.raises(BeanBagException):
+        GET(b.other)
+
+    assert errors.most_common() == [
+        ((None, "http://www.example.org/api/missing/{id}", 404), 10),
+        ((None, "http://www.example.org/api/items/{id}", 500), 5)]
+    assert errors.dropped == 1
+    assert errors.total() == 16
+
+    errors.clear()
+    assert errors.total() == 0
+
+def test_v1():
+    errors = ErrorAggregator()
+    s = ErrorSession()
+    b = beanbag.v1.BeanBag("http://www.example.org/api/", session=s,
+                           errors=errors, capture_errors=True)
+    with pytest.raises(BeanBagException) as e:
+        b.missing[3]()
+    assert isinstance(e.value.response, CapturedResponse)
+    assert len(e.value.response.content) == 1024
+    assert e.value.response.method == "GET"
+    assert errors.most_common() == [
+        (("GET", "http://www.example.org/api/missing/{id}", 404), 1)]
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+
+import pytest
+import threading
+import time
+
+from beanbag.graph import Graph
+from beanbag.v2 import BeanBag, BeanBagException, GET, POST
+from fake_req import FakeResponse
+
+class RepoSession(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.peak = 0
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        with self.lock:
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        time.sleep(0.02)
+        with self.lock:
+            self.inflight -= 1
+        path = url.split("/path/", 1)[1]
+        if path == "user":
+            return FakeResponse(content=dict(login="aj"))
+        if path == "users/aj/repos":
+            return FakeResponse(content=[dict(name="r%d" % i) for i in range(4)])
+        if path == "missing":
+            return FakeResponse(status_code=404, content={})
+        return FakeResponse(content=dict(path=path, data=data))
+
+def test_graph():
+    s = RepoSession()
+    b = BeanBag("http://www.example.org/path/", session=s)
+
+    g = Graph(max_workers=4)
+    me = g.add(GET, b.user)
+    repos = g.add(GET, lambda me: b.users[me.login].repos, me)
+    stars = g.map(GET, lambda r: b.repos.aj[r.name].stargazers, repos)
+    info = g.map(GET, lambda r: b.repos.aj[r.name], repos)
+    note = g.add(POST, b.notes, me, repos, body=lambda me, r: dict(n=len(r)))
+    results = g.run()
+
+    assert [r.path for r in results[stars]] == [
+            "repos/aj/r%d/stargazers" % i for i in range(4)]
+    assert [r.path for r in results[info]] == ["repos/aj/r%d" % i for i in range(4)]
+    assert results[note].data == '{"n": 4}'
+    assert s.peak == 4
+
+    g = Graph()
+    g.add(GET, b.missing)
+    with pytest.raises(BeanBagException):
+        g.run()
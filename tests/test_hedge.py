@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+import threading
+import time
+
+from beanbag.hedge import HedgePolicy, HedgedSession
+from beanbag.stats import endpoint
+from beanbag.v2 import BeanBag, GET, POST
+from fake_req import FakeResponse
+
+class SlowFirstSession(object):
+    def __init__(self):
+        self.calls = 0
+        self.closed = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        with self.lock:
+            self.calls += 1
+            n = self.calls
+        if n == 1:
+            time.sleep(0.5)
+        r = FakeResponse(content=dict(n=n))
+        r.close = self.close
+        return r
+
+    def close(self):
+        with self.lock:
+            self.closed += 1
+
+def test_endpoint():
+    assert (endpoint("http://host/api/users/12/repos?page=3")
+            == "http://host/api/users/{id}/repos")
+    assert endpoint("http://host/api/deadbeef99") == "http://host/api/{id}"
+
+def test_hedge():
+    s = SlowFirstSession()
+    policy = HedgePolicy(min_samples=3, max_rate=1.0)
+    for i in range(3):
+        policy.record("http://www.example.org/path/items/1", 0.01)
+
+    b = BeanBag("http://www.example.org/path/", session=HedgedSession(s, policy))
+    r = GET(b.items[7])
+    assert r.n == 2
+    assert policy.stats() == dict(requests=1, hedges_sent=1, hedges_won=1)
+
+    # the slow first request is still running; it's closed once it ends
+    assert s.closed == 0
+    for i in range(100):
+        if s.closed:
+            break
+        time.sleep(0.01)
+    assert s.closed == 1
+
+    r = POST(b.items, {})
+    assert r.n == 3
+    assert policy.stats()["requests"] == 1
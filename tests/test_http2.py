@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+import pytest
+import json
+import os
+
+import requests
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("h2")
+
+from beanbag.http2 import HTTP2Session
+from beanbag.v2 import BeanBag, GET, POST, STREAM
+
+def handler(request):
+    body = request.content.decode("utf-8") or None
+    return httpx.Response(200, json=dict(method=request.method,
+        url=str(request.url), data=body,
+        accept=request.headers.get("accept")))
+
+def test_http2_session():
+    s = HTTP2Session(transport=httpx.MockTransport(handler))
+    b = BeanBag("http://www.example.org/path/", session=s)
+
+    r = GET(b.foo(a=1))
+    assert r.method == "GET"
+    assert r.url == "http://www.example.org/path/foo?a=1"
+    assert r.accept == "application/json"
+
+    r = POST(b.foo, dict(a=1))
+    assert r.method == "POST"
+    assert json.loads(r.data) == {"a": 1}
+
+def test_multiplexed():
+    from beanbag import bench
+    stub, url = bench.start_h2_stub(100, delay=0.1)
+    try:
+        with HTTP2Session(http1=False) as s:
+            b = BeanBag(url, session=s)
+            GET(b.echo.first)
+
+            nthreads = 32
+            elapsed, errors = bench._echo_gets(bench._v2_caller(b),
+                                               nthreads, 2)
+            assert errors == []
+            assert elapsed < nthreads * 0.1 / 4   # requests overlapped
+
+            stats = GET(b.stats)
+            assert stats.connections == 1
+            assert stats.max_streams > nthreads // 2
+    finally:
+        stub.terminate()
+
+def test_requests_exceptions():
+    s = HTTP2Session(timeout=2)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        s.request("GET", "http://127.0.0.1:1/")
+    with pytest.raises(requests.exceptions.InvalidSchema):
+        s.request("GET", "ftp://www.example.org/")
+
+    def broken(request):
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    s = HTTP2Session(transport=httpx.MockTransport(broken))
+    b = BeanBag("http://www.example.org/path/", session=s)
+    with pytest.raises(requests.exceptions.Timeout):
+        GET(b.foo)
+
+    def lines(request):
+        def stream():
+            yield b'data: 1\n\n'
+            raise httpx.ReadError("connection lost")
+        return httpx.Response(200, headers={"content-type": "text/event-stream"},
+                              content=stream())
+
+    s = HTTP2Session(transport=httpx.MockTransport(lines))
+    b = BeanBag("http://www.example.org/path/", session=s)
+    evts = STREAM(b.events, reconnect=False)
+    assert next(evts).data == 1
+    with pytest.raises(requests.exceptions.ConnectionError):
+        next(evts)
+
+def test_benchmark():
+    from beanbag import bench
+    with open(os.devnull, "w") as out:
+        res = bench.http2_benchmark(max_threads=4, requests=40, delay=0.001,
+                                    out=out)
+    assert [(n, proto) for n, proto, rate, cpu, conns, errors in res] == [
+            (1, "HTTP/1.1"), (1, "HTTP/2"), (2, "HTTP/1.1"), (2, "HTTP/2"),
+            (4, "HTTP/1.1"), (4, "HTTP/2")]
+    assert all(errors == 0 for n, proto, rate, cpu, conns, errors in res)
+    assert [conns for n, proto, rate, cpu, conns, errors in res
+            if proto == "HTTP/2"] == [1, 1, 1]
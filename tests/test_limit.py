@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import threading
+import time
+
+from beanbag.limit import AdaptiveLimiter, LimitedSession
+from beanbag.v2 import BeanBag, GET
+from fake_req import FakeResponse
+
+class CountingSession(object):
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.peak = 0
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        with self.lock:
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        time.sleep(0.01)
+        with self.lock:
+            self.inflight -= 1
+        return FakeResponse(status_code=self.status_code)
+
+def test_limit_queues():
+    s = CountingSession()
+    lim = AdaptiveLimiter(initial=2, max_limit=2)
+    b = BeanBag("http://www.example.org/path/", session=LimitedSession(s, lim))
+
+    threads = [threading.Thread(target=GET, args=(b.foo,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert s.peak <= 2
+    assert lim.metrics()["inflight"] == 0
+    assert lim.metrics()["queued"] == 0
+
+def test_aimd():
+    lim = AdaptiveLimiter(initial=10)
+    for i in range(10):
+        lim.acquire()
+        lim.release(0.01)
+    assert lim.metrics()["limit"] == 10 and lim.limit > 10
+
+    lim.acquire()
+    lim.release(0.01, ok=False)
+    assert lim.metrics()["limit"] == 5
+
+    s = CountingSession(status_code=503)
+    sess = LimitedSession(s, AdaptiveLimiter(initial=8))
+    sess.request("GET", "http://www.example.org/")
+    assert sess.limiter.metrics()["limit"] == 4
+
+def test_latency_shift():
+    lim = AdaptiveLimiter(initial=50)
+    clock = [0.0]
+    lim.time = lambda: clock[0]
+
+    def run(n, latency):
+        for i in range(n):
+            lim.acquire()
+            clock[0] += latency
+            lim.release(latency)
+
+    run(100, 0.01)
+    assert lim.metrics()["limit"] >= 50
+
+    # the backend permanently slows down: the limit is cut, then recovers
+    # once the baseline has caught up with the new latency
+    run(50, 0.05)
+    assert lim.metrics()["limit"] <= 2
+    run(400, 0.05)
+    assert abs(lim.baseline - 0.05) < 0.001
+    assert lim.metrics()["limit"] >= 20
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import pytest
+import threading
+
+from beanbag.loader import BatchLoader
+from beanbag.v2 import BeanBag
+from fake_req import FakeResponse
+
+class MultiGetSession(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        with self.lock:
+            self.requests.append(params["ids"])
+        ids = [int(i) for i in params["ids"].split(",") if i != "404"]
+        return FakeResponse(content=[dict(id=i, sq=i * i) for i in ids])
+
+def test_loader():
+    s = MultiGetSession()
+    b = BeanBag("http://www.example.org/path/", session=s)
+    loader = BatchLoader(b.items, max_batch=3, window=0.05)
+
+    fs = loader.load_many([1, 2, 2, 3, 4, 404])
+    assert [f.result().sq for f in fs[:5]] == [1, 4, 4, 9, 16]
+    with pytest.raises(KeyError):
+        fs[5].result()
+    assert s.requests == ["1,2,3", "4,404"]
+
+    assert loader.get(5).sq == 25
+
+def test_loader_malformed():
+    class BadSession(object):
+        def __init__(self, content):
+            self.content = content
+
+        def request(self, method, url, params=None, data=None, headers=None):
+            return FakeResponse(content=self.content)
+
+    for content in ([dict(name="no id")], [1, 2], "text", {"1": {}}):
+        b = BeanBag("http://www.example.org/path/",
+                    session=BadSession(content))
+        loader = BatchLoader(b.items, window=0.01)
+        fs = loader.load_many([1, 2])
+        for f in fs:
+            assert f.exception(timeout=2) is not None
+
+def test_loader_results():
+    class WrappedSession(object):
+        def request(self, method, url, params=None, data=None, headers=None):
+            ids = params["ids"].split(",")
+            return FakeResponse(content=dict(
+                    items=[dict(id=int(i), sq=int(i) ** 2) for i in ids]))
+
+    b = BeanBag("http://www.example.org/path/", session=WrappedSession())
+    loader = BatchLoader(b.items, window=0.01,
+            results=lambda res: ((r["id"], r) for r in res["items"]))
+    assert [r.sq for r in loader.get_many([2, 3])] == [4, 9]
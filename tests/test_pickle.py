@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import pickle
+import pytest
+
+from beanbag.attrdict import AttrDict
+from beanbag.remote import RemoteAttrDict, changes
+from beanbag.v2 import BeanBag, GET
+from fake_req import FakeSession
+
+def test_attrdict():
+    a = AttrDict({"x": [1, 2, {"y": "z"}], "big": {"n": 1}})
+
+    b = pickle.loads(pickle.dumps(a, pickle.HIGHEST_PROTOCOL))
+    assert isinstance(b, AttrDict)
+    assert b == a
+
+    x = pickle.loads(pickle.dumps(a.x, pickle.HIGHEST_PROTOCOL))
+    assert x == [1, 2, {"y": "z"}]
+    assert x[2].y == "z"
+    assert "big" not in pickle.dumps(a.x).decode("latin-1")
+
+    missing = pickle.loads(pickle.dumps(a.new.thing))
+    missing.q = 1
+    assert +missing == {"q": 1}
+
+def test_out_of_band():
+    if pickle.HIGHEST_PROTOCOL < 5:
+        pytest.skip("pickle protocol 5 not available")
+
+    payload = bytearray(b"x" * 100000)
+    a = AttrDict({"blob": {"data": pickle.PickleBuffer(payload)}})
+    bufs = []
+    data = pickle.dumps(a.blob, 5, buffer_callback=bufs.append)
+    assert len(bufs) == 1
+    assert len(data) < 1000
+
+    b = pickle.loads(data, buffers=bufs)
+    assert bytes(b.data) == bytes(payload)
+
+def test_remote():
+    r = RemoteAttrDict({"a": 1}, url="u", etag='"e"')
+    r.b = 2
+    s = pickle.loads(pickle.dumps(r))
+    assert isinstance(s, RemoteAttrDict)
+    assert s == {"a": 1, "b": 2}
+    assert changes(s) == changes(r)
+    assert getattr(s, ".base").etag == '"e"'
+
+def test_beanbag():
+    b = BeanBag(["http://a.example.org/api", "http://b.example.org/api"],
+                ext=".json", session=FakeSession(), formats=["json"])
+    res = b.foo[3](x=1)
+
+    data = pickle.dumps(res, pickle.HIGHEST_PROTOCOL)
+    assert b"FakeSession" not in data
+
+    r = pickle.loads(data)
+    assert str(r) == "http://a.example.org/api/foo/3.json?x=1"
+    base = (~r)[0]
+    assert base.session.base_urls == (~b)[0].session.base_urls
+    assert base.formats == (~b)[0].formats
+    assert base.session is not (~b)[0].session
+
+class Service(BeanBag):
+    def __init__(self, name, token):
+        (~BeanBag).__init__(self, "http://%s.example.org/api" % (name,),
+                            session=FakeSession())
+        self.token = token
+
+def test_beanbag_subclass():
+    b = Service("users", "secret")
+    r = pickle.loads(pickle.dumps(b.foo(x=1), pickle.HIGHEST_PROTOCOL))
+    assert isinstance(r, Service)
+    assert str(r) == "http://users.example.org/api/foo?x=1"
+    base = (~r)[0]
+    assert base.token == "secret"
+    assert base.session is not (~b)[0].session
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+except ImportError:
+    from http.server import BaseHTTPRequestHandler
+
+import threading
+
+from beanbag.v2 import BeanBag, GET
+from beanbag.pool import warmup, pool_stats, _Barrier, _BrokenBarrier
+from fake_req import LocalServer
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_warmup():
+    with LocalServer(Handler) as srv:
+        b = BeanBag(srv.url + "api", pool_size=4)
+
+        assert warmup(b, n=3) == 3
+        stats = pool_stats(b)
+        assert len(stats) == 1
+        s = stats[0]
+        assert (s["host"], s["port"]) == ("127.0.0.1", srv.port)
+        assert s["maxsize"] == 4
+        assert s["connections"] == 3
+        assert s["idle"] == 3
+        assert s["in_use"] == 0
+
+        assert GET(b.foo) == {"ok": True}
+        s = pool_stats(b)[0]
+        assert s["connections"] == 3   # reused a warm connection
+        assert s["requests"] == 4
+
+def test_barrier_fallback():
+    b = _Barrier(3, timeout=5)
+    passed = []
+
+    def wait():
+        b.wait()
+        passed.append(1)
+
+    threads = [threading.Thread(target=wait) for i in range(3)]
+    for t in threads[:2]:
+        t.start()
+    assert passed == []
+    threads[2].start()
+    for t in threads:
+        t.join()
+    assert passed == [1, 1, 1]
+
+    b = _Barrier(2, timeout=0.05)
+    try:
+        b.wait()
+        assert False, "should have timed out"
+    except _BrokenBarrier:
+        pass
+
+    b = _Barrier(2, timeout=5)
+    b.abort()
+    try:
+        b.wait()
+        assert False, "should have been aborted"
+    except _BrokenBarrier:
+        pass
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+import json
+import pytest
+
+from beanbag.remote import fetch, commit, changes
+from beanbag.v2 import BeanBag, BeanBagException
+from fake_req import FakeResponse
+
+class DocSession(object):
+    def __init__(self, patch=True):
+        self.doc = {"title": "a", "tags": ["x", "y"], "meta": {"draft": True}}
+        self.etag = 1
+        self.patch = patch
+        self.requests = []
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        self.requests.append((method, headers.get("Content-Type"),
+                              json.loads(data) if data else None))
+        if method != "GET" and headers.get("If-Match") != '"%d"' % self.etag:
+            return FakeResponse(status_code=412, content={})
+        if method == "PATCH" and not self.patch:
+            return FakeResponse(status_code=405, content={})
+        if method == "PUT":
+            self.doc = json.loads(data)
+        if method in ("PUT", "PATCH"):
+            self.etag += 1
+        r = FakeResponse(content=self.doc)
+        r.headers["etag"] = '"%d"' % self.etag
+        return r
+
+def test_patch():
+    s = DocSession()
+    b = BeanBag("http://www.example.org/path/", session=s)
+
+    doc = fetch(b.docs[1])
+    doc.title = "b"
+    doc.tags[1] = "z"
+    doc.owner.name = "aj"
+    del doc.meta.draft
+    assert changes(doc) == [
+        {"op": "replace", "path": "/title", "value": "b"},
+        {"op": "replace", "path": "/tags/1", "value": "z"},
+        {"op": "add", "path": "/owner", "value": {"name": "aj"}},
+        {"op": "remove", "path": "/meta/draft"},
+    ]
+    ops = changes(doc)
+    commit(doc)
+    assert s.requests[-1] == ("PATCH", "application/json-patch+json", ops)
+    assert +doc == {"title": "b", "tags": ["x", "z"], "meta": {},
+                    "owner": {"name": "aj"}}
+    assert changes(doc) == []
+    commit(doc)    # nothing to do
+    assert len(s.requests) == 2
+
+    doc.title = "c"
+    commit(doc)
+    assert s.requests[-1][2] == [{"op": "replace", "path": "/title", "value": "c"}]
+
+    stale = fetch(b.docs[1])
+    s.etag += 1
+    stale.title = "d"
+    with pytest.raises(BeanBagException):
+        commit(stale)
+
+def test_put_fallback():
+    s = DocSession(patch=False)
+    b = BeanBag("http://www.example.org/path/", session=s)
+    doc = fetch(b.docs[1])
+    doc["a/b"] = 1
+    assert changes(doc)[0]["path"] == "/a~1b"
+    commit(doc)
+    assert [r[0] for r in s.requests] == ["GET", "PATCH", "PUT"]
+    assert s.doc["a/b"] == 1
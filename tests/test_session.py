@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+except ImportError:
+    from http.server import BaseHTTPRequestHandler
+
+from beanbag.v2 import BeanBag, GET
+from beanbag.pool import pool_stats
+from fake_req import LocalServer
+
+class EchoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = ('{"path": "%s", "token": "%s"}' % (self.path,
+                self.headers.get("X-Token"))).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def test_threadsafe():
+    nthreads, nreqs = 64, 5
+
+    with LocalServer(EchoHandler) as srv:
+        b = BeanBag(srv.url, pool_size=nthreads, threadsafe=True)
+        tls = (~b)[0].session
+        tls.headers["X-Token"] = "secret"
+
+        errors = []
+        def worker(t):
+            try:
+                for i in range(nreqs):
+                    r = GET(b.t[t][i])
+                    assert r.path == "/t/%d/%d" % (t, i)
+                    assert r.token == "secret"
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker, args=(t,))
+                   for t in range(nthreads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert errors == []
+        assert tls.created == nthreads
+
+        stats = pool_stats(b)
+        assert len(stats) == 1
+        assert stats[0]["requests"] == nthreads * nreqs
+        assert stats[0]["connections"] <= nthreads
+        assert stats[0]["idle"] == stats[0]["connections"]
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+from beanbag.v2 import BeanBag, BeanBagException, GET
+from beanbag.limit import LimitedSession, AdaptiveLimiter
+from fake_req import SimulatedSession
+
+class VirtualClock(object):
+    def __init__(self):
+        self.slept = []
+
+    def __call__(self, t):
+        self.slept.append(t)
+
+def test_deterministic():
+    def run():
+        clock = VirtualClock()
+        s = SimulatedSession(latency=0.05, distribution="lognormal",
+                             jitter=0.01, error_rate=0.2, seed=7, sleep=clock)
+        b = BeanBag("http://sim/api/", session=s)
+        statuses = []
+        for i in range(50):
+            try:
+                GET(b.items[i % 5])
+                statuses.append(200)
+            except BeanBagException as e:
+                statuses.append(e.response.status_code)
+        return clock.slept, statuses, s.errors
+
+    assert run() == run()
+    slept, statuses, errors = run()
+    assert statuses.count(503) == errors
+    assert 0 < errors < 25
+    assert all(t >= 0 for t in slept)
+
+def test_bandwidth_and_timeouts():
+    clock = VirtualClock()
+    s = SimulatedSession(handler=lambda *a: (200, "x" * 10000),
+                         bandwidth=100000, sleep=clock)
+    r = s.request("GET", "http://sim/big")
+    assert r.content == b"x" * 10000
+    assert clock.slept == [pytest.approx(0.1)]
+    assert r.elapsed.total_seconds() == pytest.approx(0.1)
+
+    s = SimulatedSession(timeout_rate=1.0, timeout=10.0, sleep=clock)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        s.request("GET", "http://sim/slow", timeout=2.0)
+    assert clock.slept[-1] == 2.0
+    assert s.timeouts == 1
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        s.request("GET", "http://sim/slow", timeout=(0.5, 3.0))
+    assert clock.slept[-1] == 3.0
+
+def test_threads():
+    s = SimulatedSession(latency=0.02, max_connections=4)
+    b = BeanBag("http://sim/api/", session=s)
+
+    threads = [threading.Thread(target=GET, args=(b.items[i],))
+               for i in range(16)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    assert s.requests == 16
+    assert 1 <= s.max_inflight <= 4
+    assert elapsed >= 4 * 0.02
+
+def test_limiter_sees_overload():
+    s = SimulatedSession(error_rate=1.0, error_status=503, sleep=VirtualClock())
+    limiter = AdaptiveLimiter(initial=16)
+    b = BeanBag("http://sim/api/", session=LimitedSession(s, limiter))
+    with pytest.raises(BeanBagException):
+        GET(b.items[1])
+    assert limiter.metrics()["limit"] < 16
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason="needs asyncio.run")
+def test_asyncio():
+    import asyncio
+
+    s = SimulatedSession(latency=0.02, max_connections=5)
+
+    async def main():
+        return await asyncio.gather(*[s.arequest("GET", "http://sim/%d" % i)
+                                      for i in range(20)])
+
+    start = time.time()
+    responses = asyncio.run(main())
+    assert time.time() - start >= 4 * 0.02
+    assert [r.json()["url"] for r in responses] == \
+           ["http://sim/%d" % i for i in range(20)]
+    assert s.max_inflight == 5
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import threading
+
+from beanbag.graph import Graph
+from beanbag.snapshot import snapshot, wrap
+from beanbag.v2 import BeanBag, GET, PUT, POST
+import beanbag.v1
+from fake_req import FakeResponse
+
+class CountingSession(object):
+    def __init__(self):
+        self.headers = {}
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                stream=False):
+        with self.lock:
+            self.requests.append((method, url))
+        return FakeResponse(content=dict(url=url, params=params))
+
+def test_snapshot():
+    s = CountingSession()
+    b = BeanBag("http://www.example.org/api/", session=s)
+
+    with snapshot(b) as snap:
+        u1 = GET(b.users[1])
+        assert GET(b.users[1]) is u1
+        GET(b.users[1](full=1))
+        GET(b.users[1](full=1))
+        GET(b.users)
+        GET(b.orgs[1])
+        assert len(s.requests) == 4
+        assert snap.hits == 2
+
+        PUT(b.users[1], {"name": "x"})   # drops users, users/1, users/1?full
+        GET(b.users[1])
+        GET(b.users)
+        GET(b.orgs[1])
+        assert len(s.requests) == 7
+
+        POST(b.users, {"name": "y"})
+        GET(b.users[1])
+        assert len(s.requests) == 9
+
+    GET(b.orgs[1])
+    assert len(s.requests) == 10
+
+def test_root():
+    s = CountingSession()
+    b = BeanBag("http://www.example.org/api/", session=s)
+
+    with snapshot(b):
+        GET(b)
+        GET(b)
+        assert len(s.requests) == 1
+        POST(b.users, {"name": "y"})
+        GET(b)
+        assert len(s.requests) == 3
+
+def test_threads():
+    s = CountingSession()
+    b = BeanBag("http://www.example.org/api/", session=s)
+
+    with snapshot(b):
+        GET(b.settings)
+        t = threading.Thread(target=wrap(lambda: GET(b.settings)))
+        t.start()
+        t.join()
+        assert len(s.requests) == 1
+
+        g = Graph()
+        g.add(GET, b.settings)
+        g.add(GET, b.users[3])
+        g.run()
+        GET(b.users[3])
+        assert len(s.requests) == 2
+
+        # threads not wrapped don't see the snapshot
+        t = threading.Thread(target=lambda: GET(b.settings))
+        t.start()
+        t.join()
+        assert len(s.requests) == 3
+
+def test_v1():
+    s = CountingSession()
+    b = beanbag.v1.BeanBag("http://www.example.org/api/", session=s)
+
+    with snapshot(b):
+        b.users[1]()
+        b.users[1]()
+        b.users[1](page=2)
+        assert len(s.requests) == 2
+        b.users(ids=[1, 2])
+        b.users(ids=[1, 2])
+        assert len(s.requests) == 4
+        del s.requests[2:]
+        b.users[1] = {"name": "x"}
+        b.users[1]()
+        del b.users[2]     # doesn't affect users/1
+        b.users[1]()
+        b.users += {"name": "z"}
+        b.users[1]()
+        assert [m for m, u in s.requests] == ["GET", "GET", "PUT", "GET",
+                                              "DELETE", "PATCH", "GET"]
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import requests
+
+from beanbag.attrdict import AttrDict
+from beanbag.sse import parse
+from beanbag.v2 import BeanBag, STREAM
+from fake_req import FakeResponse
+
+def test_parse():
+    lines = [": comment", "event: update", "data: {\"a\": 1}", "id: 7", "",
+             "data:line1", "data: line2", "retry: 250", "", "retry: 10", "",
+             "data: partial"]
+    evts = list(parse(l.encode("utf-8") for l in lines))
+    assert [(e.event, e.data, e.id, e.retry) for e in evts] == [
+            ("update", '{"a": 1}', "7", None),
+            ("message", "line1\nline2", "7", 250),
+            (None, None, "7", 10)]
+
+class EventSession(object):
+    def __init__(self, streams):
+        self.streams = streams
+        self.seen = []
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                stream=False):
+        assert stream and headers["Accept"].startswith("text/event-stream")
+        self.seen.append(headers.get("Last-Event-ID"))
+        if not self.streams:
+            return FakeResponse(status_code=204, content="")
+        body = self.streams.pop(0)
+        r = FakeResponse(content=body)
+        r.headers = {"content-type": "text/event-stream"}
+        if body.endswith("BROKEN"):
+            lines = r.iter_lines
+            def broken(chunk_size=512):
+                for l in lines():
+                    if l == b"BROKEN":
+                        raise requests.exceptions.ConnectionError()
+                    yield l
+            r.iter_lines = broken
+        return r
+
+def test_stream_reconnect():
+    s = EventSession(['id: 1\ndata: {"n": 1}\n\nretry: 0\n\nBROKEN',
+                      'id: 2\ndata: hello\n\n'])
+    b = BeanBag("http://www.example.org/path/", session=s)
+
+    evts = list(STREAM(b.events, retry=10))
+    assert type(evts[0].data) is AttrDict and evts[0].data.n == 1
+    assert [e.data for e in evts[1:]] == ["hello"]
+    assert s.seen == [None, "1", "2"]
+
+def test_stream_reconnect_keeps_id():
+    s = EventSession(['id: 1\ndata: one\n\nretry: 0\n\nBROKEN',
+                      'data: two\n\nBROKEN',
+                      'data: three\n\n'])
+    b = BeanBag("http://www.example.org/path/", session=s)
+
+    evts = list(STREAM(b.events, retry=0))
+    assert [(e.data, e.id) for e in evts] == [
+            ("one", "1"), ("two", "1"), ("three", "1")]
+    assert s.seen == [None, "1", "1", "1"]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import datetime
+import json
+
+from beanbag.trace import Tracer
+from beanbag.v2 import BeanBag, GET, POST
+import beanbag.v1
+from fake_req import FakeResponse
+
+class TracedSession(object):
+    def __init__(self):
+        self.headers = {}
+        self.sent = []
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                stream=False):
+        self.sent.append(headers)
+        r = FakeResponse(content={"ok": True})
+        r.elapsed = datetime.timedelta(milliseconds=5)
+        return r
+
+def test_spans():
+    t = Tracer()
+    s = TracedSession()
+    b = BeanBag("http://www.example.org/api/", session=s, tracer=t)
+
+    with t.span("handler", traceparent="00-%s-%s-01" % ("a" * 32, "b" * 16)):
+        POST(b.users[1234].posts, {"title": "hi"})
+
+    spans = dict((sp.name, sp) for sp in t.spans)
+    assert sorted(spans) == ["decode", "encode", "handler", "request",
+                             "send", "wait"]
+    assert set(sp.trace_id for sp in t.spans) == set(["a" * 32])
+
+    handler, req = spans["handler"], spans["request"]
+    assert handler.parent_id == "b" * 16
+    assert req.parent_id == handler.span_id
+    for name in ("encode", "send", "decode"):
+        assert spans[name].parent_id == req.span_id
+    assert spans["wait"].parent_id == spans["send"].span_id
+    assert abs((spans["wait"].end - spans["wait"].start) - 0.005) < 1e-6
+
+    assert req.attrs == dict(method="POST", status=200,
+                             path="http://www.example.org/api/users/{id}/posts")
+    assert s.sent[0]["traceparent"] == spans["send"].traceparent()
+
+    events = json.loads(json.dumps(t.chrome()))["traceEvents"]
+    assert [e["name"] for e in events][:3] == ["handler", "request", "encode"]
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+
+def test_untraced():
+    s = TracedSession()
+    b = BeanBag("http://www.example.org/api/", session=s)
+    GET(b.foo)
+    assert s.sent[0].get("traceparent") is None
+
+def test_v1():
+    t = Tracer(propagate=False)
+    s = TracedSession()
+    b = beanbag.v1.BeanBag("http://www.example.org/api/", session=s,
+                           tracer=t)
+    b.foo.bar = {"x": 1}
+    names = sorted(sp.name for sp in t.spans)
+    assert names == ["decode", "encode", "request", "send", "wait"]
+    assert s.sent == [None]
+    req = [sp for sp in t.spans if sp.name == "request"][0]
+    assert req.attrs["method"] == "PUT"
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+import threading
+
+from beanbag.v2 import BeanBag
+from beanbag.watch import Watch, Watcher, watch
+from fake_req import FakeResponse
+
+class VersionedSession(object):
+    def __init__(self, versions):
+        self.versions = versions
+        self.seen = []
+
+    def request(self, method, url, params=None, data=None, headers=None):
+        n = self.versions.pop(0) if len(self.versions) > 1 else self.versions[0]
+        etag = '"%d"' % (n,)
+        self.seen.append(headers.get("If-None-Match"))
+        if headers.get("If-None-Match") == etag:
+            r = FakeResponse(status_code=304, content="")
+        else:
+            r = FakeResponse(content=dict(version=n))
+        r.headers["etag"] = etag
+        return r
+
+def test_watch():
+    s = VersionedSession([1, 1, 1, 2, 2, 3])
+    b = BeanBag("http://www.example.org/path/", session=s)
+
+    w = watch(b.job, interval=0)
+    assert [next(w).version for i in range(3)] == [1, 2, 3]
+    assert s.seen == [None, '"1"', '"1"', '"1"', '"2"', '"2"']
+
+def test_backoff():
+    s = VersionedSession([1])
+    b = BeanBag("http://www.example.org/path/", session=s)
+    w = Watch(b.job, interval=1, max_interval=5)
+    assert w.poll() and w.delay == 1
+    assert [(w.poll(), w.delay) for i in range(4)] == [
+            (False, 2), (False, 4), (False, 5), (False, 5)]
+
+def test_watcher():
+    s = VersionedSession([1, 2])
+    b = BeanBag("http://www.example.org/path/", session=s)
+    seen = []
+    done = threading.Event()
+    def cb(value):
+        seen.append(value.version)
+        if len(seen) == 2:
+            done.set()
+
+    watcher = Watcher()
+    watcher.add(b.job, cb, interval=0.01)
+    assert done.wait(5)
+    watcher.stop()
+    assert seen == [1, 2]